@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark for the extraction engine of RPA Kit. A synthetic RPA-3.0 archive of
+the corpus generator is written to a temp directory and then unpacked with the
+current engine and with the former per-entry reopen path, so both can be
+compared on the same data.
+"""
+
+# pylint:disable=c0116
+
+import sys
+import argparse
+import tempfile
+import time
+import pickle
+import zlib
+import shutil
+import tracemalloc
+from pathlib import Path as pt
+
+sys.path.insert(0, str(pt(__file__).resolve().parents[1] / 'ur_tools'))
+import rpakit  # noqa: E402  pylint:disable=c0413
+import rpakit_corpus  # noqa: E402  pylint:disable=c0413
+
+
+__title__ = 'RPA Kit bench'
+__license__ = 'GPLv3'
+__author__ = 'madeddy'
+__status__ = 'Development'
+__version__ = '0.1.0-alpha'
+
+
+def legacy_unpack(rkit):
+    """The former extraction path: reopens the depot and copies every entry."""
+    for file_pt, file_data in rkit._reg.items():  # pylint:disable=w0212
+        tmp_path = rkit.check_out_pt(file_pt)
+        rkit.make_dirstruct(tmp_path.parent)
+        with pt(rkit.depot).open('rb') as ofi:
+            if len(file_data) == 1:
+                ofs, leg, pre = file_data[0]
+                ofi.seek(ofs)
+                tmp_file = pre + ofi.read(leg - len(pre))
+            else:
+                part = []
+                for ofs, leg, pre in file_data:
+                    ofi.seek(ofs)
+                    part.append(ofi.read(leg))
+                tmp_file = b''.join(part)
+        with tmp_path.open('wb') as ofi:
+            ofi.write(tmp_file)
+
+
+def legacy_init(rkit):
+    """The former index decode: reads, inflates and unpickles the index whole."""
+    rkit.get_header()
+    rkit.guess_version()
+    rkit.get_version_specs()
+    offset, key = rkit.get_cipher()
+    with pt(rkit.depot).open('rb') as ofi:
+        ofi.seek(offset)
+        reg = pickle.loads(zlib.decompress(ofi.read()), encoding='bytes')
+    for val in reg.values():
+        if len(val[0]) == 2:
+            for num, _ in enumerate(val):
+                val[num] += (b'',)
+    for _kv in reg:
+        reg[_kv] = [(ofs ^ key, leg ^ key, pre) for ofs, leg, pre in reg[_kv]]
+    rkit._reg = {rkit.utfify(_pt): _d for _pt, _d in reg.items()}  # pylint:disable=w0212
+
+
+def run_index(depot, initializer, cache_dir=None):
+    """Decodes the depot's index once. Returns seconds, peak traced MiB and the
+    MiB the decoded register holds.
+    """
+    rkit = rpakit.RPAKit()
+    rkit.depot = depot
+    rkit.cache_dir = cache_dir
+    tracemalloc.start()
+    start = time.perf_counter()
+    initializer(rkit)
+    took = time.perf_counter() - start
+    held, peak = (mem / 1024 ** 2 for mem in tracemalloc.get_traced_memory())
+    tracemalloc.stop()
+    return took, peak, held
+
+
+def run_case(depot, out_pt, unpacker, jobs=1, kcopy=True):
+    """Initializes the depot and times one unpack run. Returns wall and cpu
+    seconds.
+    """
+    shutil.rmtree(out_pt, ignore_errors=True)
+    rkit = rpakit.RPAKit()
+    rkit.jobs = jobs
+    if not kcopy:
+        rkit.copy_modes = []
+    rkit.depot = depot
+    rkit.out_pt = out_pt
+    rkit.init_depot()
+    start, cpu = time.perf_counter(), time.process_time()
+    unpacker(rkit)
+    return time.perf_counter() - start, time.process_time() - cpu
+
+
+def bench_main(cfg):
+    rpakit.RKC.verbosity = 0
+    cases = {'legacy': (legacy_unpack, 1, False),
+             'mmap': (rpakit.RPAKit.unpack_depot, 1, False),
+             'kernel': (rpakit.RPAKit.unpack_depot, 1, True),
+             f'kernel-j{cfg.jobs}': (rpakit.RPAKit.unpack_depot, cfg.jobs, True)}
+    with tempfile.TemporaryDirectory(prefix='rkbench_') as tmp:
+        depot = pt(tmp) / 'bench.rpa'
+        rpakit_corpus.make_depot(depot, 'rpa3', entries=cfg.entries, size=cfg.size,
+                                 seed=cfg.entries)
+        mb_total = depot.stat().st_size / 1024 ** 2
+        print(f"Archive: {cfg.entries} entries, {mb_total:.1f} MiB")
+        run_index(depot, rpakit.RPAKit.init_depot, pt(tmp) / 'cache')
+        for name, initializer, cache_dir in (('index-old', legacy_init, None),
+                                             ('index', rpakit.RPAKit.init_depot, None),
+                                             ('index-warm', rpakit.RPAKit.init_depot,
+                                              pt(tmp) / 'cache')):
+            took, peak, held = run_index(depot, initializer, cache_dir)
+            print(f"{name:>10}: {took:8.3f} s  {peak:8.1f} MiB peak while decoding  "
+                  f"{held:8.1f} MiB held")
+        for name, (unpacker, jobs, kcopy) in cases.items():
+            best, cpu = min(run_case(depot, pt(tmp) / name, unpacker, jobs, kcopy)
+                            for _ in range(cfg.rounds))
+            print(f"{name:>10}: {best:8.3f} s  {cpu:8.3f} s cpu  "
+                  f"{cfg.entries / best:10.0f} entries/s  {mb_total / best:8.1f} MiB/s")
+
+
+def parse_args():
+    aps = argparse.ArgumentParser(description="Benchmark for the RPA Kit extraction engine.")
+    aps.add_argument('--entries', type=int, default=5000,
+                     help='Number of entries in the synthetic archive.')
+    aps.add_argument('--size', type=int, default=16384,
+                     help='Average entry size in bytes.')
+    aps.add_argument('--jobs', type=int, default=4,
+                     help='Thread count for the parallel case.')
+    aps.add_argument('--rounds', type=int, default=3,
+                     help='Runs per case; the best one is reported.')
+    return aps.parse_args()
+
+
+if __name__ == '__main__':
+    bench_main(parse_args())
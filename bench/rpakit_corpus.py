@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+"""
+Generator for synthetic RenPy archives. It writes archives in every format
+RPA Kit reads: RPA-1 `.rpi`/`.rpa` pairs, RPA-2.0, RPA-3.0, RPA-3.2, ALT-1.0
+and the alias headers. Entry count, size distribution, multi segment and
+prefixed entries are configurable.
+"""
+
+# pylint:disable=c0116
+
+import os
+import sys
+import argparse
+import hashlib
+import pickle
+import random
+import zlib
+from pathlib import Path as pt
+
+
+__title__ = 'RPA corpus'
+__license__ = 'GPLv3'
+__author__ = 'madeddy'
+__status__ = 'Development'
+__version__ = '0.1.0-alpha'
+
+
+ALT_KEY2 = 0xDABE8DF0
+
+# header template, key is stored in the header, register uses 3-tuples
+FORMATS = {'rpa1': (None, False, False),
+           'rpa2': ("RPA-2.0 {offset:016x}\n", False, False),
+           'rpa3': ("RPA-3.0 {offset:016x} {key:08x}\n", True, True),
+           'rpa31': ("RPA-3.1 {offset:016x} {key:08x}\n", True, True),
+           'rpa4': ("RPA-4.0 {offset:016x} {key:08x}\n", True, True),
+           'rpa32': ("RPA-3.2 {offset:016x} 1 {key:08x}\n", True, True),
+           'rpi3': ("RPI-3.0 {offset:016x} 1 {key:08x}\n", True, True),
+           'alt1': ("ALT-1.0 {key:08x} {offset:016x}\n", True, True)}
+
+DISTS = ('fixed', 'uniform', 'lognormal')
+
+
+def entry_sizes(rnd, entries, size, dist):
+    """Yields entry sizes of the given distribution around the mean size."""
+    for _ in range(entries):
+        if dist == 'fixed':
+            yield size
+        elif dist == 'uniform':
+            yield rnd.randint(0, size * 2)
+        else:  # heavy tail, like a mix of scripts and media
+            yield min(int(rnd.lognormvariate(0, 1.2) * size / 2.05), size * 200)
+
+
+def make_depot(depot, fmt='rpa3', entries=1000, size=16384, dist='uniform',
+               multi=0.0, prefix=0.0, seed=0):
+    """Writes a synthetic archive. For rpa1 the given path is the `.rpi` index
+    file and the data goes to its `.rpa` twin. Returns the blake2b digests of
+    the entrys by name, to verify extracted output.
+    """
+    header, keyed, triple = FORMATS[fmt]
+    rnd = random.Random(seed)
+    key = rnd.getrandbits(32) if keyed else 0
+    depot = pt(depot)
+    data_pt = depot.with_suffix('.rpa') if fmt == 'rpa1' else depot
+    head_len = len(header.format(offset=0, key=0)) if header else 0
+    digests, reg = {}, {}
+
+    with data_pt.open('wb') as ofi:
+        ofi.write(b'\0' * head_len)
+        for num, leg in enumerate(entry_sizes(rnd, entries, size, dist)):
+            data = os.urandom(leg)
+            name = f"dir_{num % 16}/sub_{num % 3}/file_{num}.{('rpyc', 'png', 'ogg')[num % 3]}"
+            digests[name] = hashlib.blake2b(data, digest_size=20).digest()
+            parts = []
+            if leg > 2 and rnd.random() < multi:
+                cut = rnd.randint(1, leg - 1)
+                for chunk in (data[:cut], data[cut:]):
+                    parts.append((ofi.tell(), len(chunk), b''))
+                    ofi.write(chunk)
+                    ofi.write(os.urandom(rnd.randint(0, 16)))  # gap between segments
+            elif leg > 0 and triple and rnd.random() < prefix:
+                pre = data[:rnd.randint(1, min(leg, 16))]
+                parts.append((ofi.tell(), leg, pre))
+                ofi.write(data[len(pre):])
+            else:
+                parts.append((ofi.tell(), leg, b''))
+                ofi.write(data)
+
+            reg[name] = [(ofs ^ key, leg ^ key, pre) if triple else (ofs ^ key, leg ^ key)
+                         for ofs, leg, pre in parts]
+
+        index = zlib.compress(pickle.dumps(reg, 2))
+        if fmt == 'rpa1':
+            depot.write_bytes(index)
+            return digests
+
+        offset = ofi.tell()
+        ofi.write(index)
+        ofi.seek(0)
+        hkey = key ^ ALT_KEY2 if fmt == 'alt1' else key
+        ofi.write(header.format(offset=offset, key=hkey).encode())
+    return digests
+
+
+def make_corpus(dst, formats=tuple(FORMATS), **kwargs):
+    """Writes one archive per format into dst. Returns the archive paths and
+    their digests by format.
+    """
+    pt(dst).mkdir(parents=True, exist_ok=True)
+    corpus = {}
+    for fmt in formats:
+        suffix = '.rpi' if fmt == 'rpa1' else '.rpa'
+        depot = pt(dst) / f"{fmt}{suffix}"
+        corpus[fmt] = (depot, make_depot(depot, fmt, **kwargs))
+    return corpus
+
+
+def parse_args():
+    aps = argparse.ArgumentParser(description="Writes synthetic RenPy archives.")
+    aps.add_argument('dst', help='Output directory of the archives.')
+    aps.add_argument('--formats', default=','.join(FORMATS),
+                     help=f"Comma separated formats. Default: all of {', '.join(FORMATS)}")
+    aps.add_argument('--entries', type=int, default=1000)
+    aps.add_argument('--size', type=int, default=16384, help='Mean entry size in bytes.')
+    aps.add_argument('--dist', choices=DISTS, default='uniform')
+    aps.add_argument('--multi', type=float, default=0.0,
+                     help='Fraction of entrys stored in two segments.')
+    aps.add_argument('--prefix', type=float, default=0.0,
+                     help='Fraction of entrys with a register prefix.')
+    aps.add_argument('--seed', type=int, default=0)
+    return aps.parse_args()
+
+
+if __name__ == '__main__':
+    CFG = parse_args()
+    for _fmt, (_depot, _dig) in make_corpus(
+            CFG.dst, CFG.formats.split(','), entries=CFG.entries, size=CFG.size,
+            dist=CFG.dist, multi=CFG.multi, prefix=CFG.prefix, seed=CFG.seed).items():
+        print(f"{_fmt:>6}: {_depot} ({len(_dig)} entries)", file=sys.stderr)
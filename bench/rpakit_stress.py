@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+"""
+Stress check for concurrent RPA Kit jobs in one process. Several RKmain
+instances extract different synthetic archives at the same time from threads,
+each with its own output level and job count. Afterwards every output file is
+checked against the digests of the generator and every instance against its
+own counters. Exits with 1 if anything got mixed up.
+"""
+
+# pylint:disable=c0116
+
+import os
+import sys
+import argparse
+import contextlib
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path as pt
+
+sys.path.insert(0, str(pt(__file__).resolve().parents[1] / 'ur_tools'))
+import rpakit  # noqa: E402  pylint:disable=c0413
+import rpakit_corpus  # noqa: E402  pylint:disable=c0413
+
+
+__title__ = 'RPA Kit stress'
+__license__ = 'GPLv3'
+__author__ = 'madeddy'
+__status__ = 'Development'
+__version__ = '0.1.0-alpha'
+
+
+def run_job(num, depot, cfg):
+    """Extracts one archive with its own RKmain. Returns the instance."""
+    rkm = rpakit.RKmain(str(depot), outdir=f"out_{num}", verbose=(0, 1, 2)[num % 3],
+                        task='exp', jobs=1 + num % cfg.jobs, resume=False,
+                        progress_bg=num % 2 == 1)
+    rkm.cfg_control()
+    return rkm
+
+
+def check_job(num, rkm, depot, digests):
+    """Returns the problems found in the output and counters of one job."""
+    errs = []
+    if rkm.verbosity != (0, 1, 2)[num % 3]:
+        errs.append(f"verbosity is {rkm.verbosity}")
+    expect = {'dep_found': 1, 'dep_done': 1, 'fle_total': len(digests),
+              'fle_done': len(digests)}
+    for key, val in expect.items():
+        if rkm.count[key] != val:
+            errs.append(f"count {key} is {rkm.count[key]}, expected {val}")
+    if rkm.out_pt != pt(depot).parent / f"out_{num}":
+        errs.append(f"output path is {rkm.out_pt}")
+    for name, digest in digests.items():
+        try:
+            data = (pt(rkm.out_pt) / name).read_bytes()
+        except OSError as err:
+            errs.append(f"{name}: {err.strerror}")
+            continue
+        if hashlib.blake2b(data, digest_size=20).digest() != digest:
+            errs.append(f"{name}: content differs")
+    return errs
+
+
+def stress_main(cfg):
+    formats = list(rpakit_corpus.FORMATS)
+    failed = 0
+    with tempfile.TemporaryDirectory(prefix='rkstress_') as tmp:
+        cases = []
+        for num in range(cfg.parallel):
+            fmt = formats[num % len(formats)]
+            suffix = '.rpi' if fmt == 'rpa1' else '.rpa'
+            depot = pt(tmp) / f"job_{num}" / f"{fmt}{suffix}"
+            depot.parent.mkdir()
+            cases.append((depot, rpakit_corpus.make_depot(
+                depot, fmt, entries=cfg.entries, size=cfg.size, dist='lognormal',
+                multi=0.1, prefix=0.1, seed=num)))
+
+        for rnd in range(cfg.rounds):
+            with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null), \
+                    ThreadPoolExecutor(max_workers=cfg.parallel) as pool:
+                jobs = [pool.submit(run_job, num, depot, cfg)
+                        for num, (depot, _dig) in enumerate(cases)]
+                kits = [job.result() for job in jobs]
+
+            for num, (rkm, (depot, digests)) in enumerate(zip(kits, cases)):
+                for err in check_job(num, rkm, depot, digests):
+                    failed += 1
+                    print(f"round {rnd} job {num}: {err}")
+            if rpakit.RKC.verbosity != 1:
+                failed += 1
+                print(f"round {rnd}: the default verbosity changed to {rpakit.RKC.verbosity}")
+
+    total = cfg.parallel * cfg.rounds
+    print(f"{total} extractions in {cfg.rounds} round(s) of {cfg.parallel}: "
+          f"{'all ok' if not failed else f'{failed} problems'}")
+    return 1 if failed else 0
+
+
+def parse_args():
+    aps = argparse.ArgumentParser(description="Runs concurrent RPA Kit extractions in one process.")
+    aps.add_argument('--parallel', type=int, default=8, help='Simultaneous extractions.')
+    aps.add_argument('--rounds', type=int, default=3)
+    aps.add_argument('--entries', type=int, default=500)
+    aps.add_argument('--size', type=int, default=8192, help='Mean entry size in bytes.')
+    aps.add_argument('--jobs', type=int, default=4, help='Max threads per extraction.')
+    return aps.parse_args()
+
+
+if __name__ == '__main__':
+    sys.exit(stress_main(parse_args()))
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark suite for RPA Kit. A synthetic corpus with every supported archive
+format is generated and the tasks list, test and expand are measured on each
+archive. Every case runs in a fresh process, so the peak RSS belongs to it
+alone. With the null sink the expand task reads all entry data but writes
+nothing, which isolates the pure read cost. With --calibrate the cost per file
+and per byte of the expand task are measured instead and stored for the plan
+task of RPA Kit.
+"""
+
+# pylint:disable=c0116
+
+import os
+import sys
+import argparse
+import contextlib
+import json
+import platform
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path as pt
+
+sys.path.insert(0, str(pt(__file__).resolve().parents[1] / 'ur_tools'))
+import rpakit  # noqa: E402  pylint:disable=c0413
+import rpakit_corpus  # noqa: E402  pylint:disable=c0413
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+__title__ = 'RPA Kit suite'
+__license__ = 'GPLv3'
+__author__ = 'madeddy'
+__status__ = 'Development'
+__version__ = '0.1.0-alpha'
+
+
+class NullWriter:
+    """Output file stand-in which reads the data it gets and drops it."""
+    chunk = 1024 ** 2
+
+    def __init__(self, name):
+        self.name = name
+        self.size = 0
+        self._fd = os.open(os.devnull, os.O_WRONLY)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        os.close(self._fd)
+
+    def write(self, data):
+        view = memoryview(data)
+        for pos in range(0, len(view), self.chunk):
+            bytes(view[pos:pos + self.chunk])  # touches the pages, so they are read
+        self.size += len(view)
+        return len(view)
+
+    def fileno(self):
+        return self._fd
+
+    def tell(self):
+        return self.size
+
+    def flush(self):
+        pass
+
+    def truncate(self):
+        pass
+
+
+class NullKit(rpakit.RPAKit):
+    """RPAKit which extracts into NullWriters; no files, dirs or manifests."""
+
+    def __init__(self):
+        super().__init__()
+        self.copy_modes = []
+        self.resume = False
+
+    def plan_output(self):
+        return {_fn: pt(self.out_pt) / (_fn or 'unnamed') for _fn in self._reg}
+
+    def open_output(self, tmp_path):
+        return NullWriter(str(tmp_path))
+
+    def preallocate(self, ofi, size):
+        return False
+
+    def open_manifest(self):
+        pass
+
+    def close_manifest(self):
+        pass
+
+    def record_entry(self, rec):
+        pass
+
+
+def peak_rss():
+    """Returns the peak resident set size of this process in MiB if known."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 ** 2 if sys.platform == 'darwin' else rss / 1024
+
+
+def run_case(depot, task, sink, out_pt, jobs):
+    """Runs one task on one archive. Meant for a fresh worker process."""
+    rpakit.RKC.verbosity = 0
+    rkit = NullKit() if sink == 'null' else rpakit.RPAKit()
+    rkit.depot, rkit.out_pt, rkit.jobs = depot, out_pt, jobs
+    shutil.rmtree(out_pt, ignore_errors=True)
+
+    start = time.perf_counter()
+    rkit.init_depot()
+    t_index = time.perf_counter() - start
+    reg = rkit._reg  # pylint:disable=w0212
+    size = sum(rkit.entry_size(_d) for _d in reg.values())
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        rkit.run_task(task)
+    t_task = time.perf_counter() - start - t_index
+    return {'index': t_index, 'task': t_task, 'entries': len(reg),
+            'bytes': size, 'rss': peak_rss()}
+
+
+def calibrate(cfg, tmp):
+    """Expands a archive of many small and one of few large entrys and fits the
+    time per file and per byte to both. The result goes where the plan task
+    reads it.
+    """
+    cases = []
+    for name, entries, size in (('small', 20000, 512), ('large', 64, 4 * 1024 ** 2)):
+        depot = pt(tmp) / 'calibrate' / f"{name}.rpa"
+        depot.parent.mkdir(parents=True, exist_ok=True)
+        rpakit_corpus.make_depot(depot, 'rpa3', entries=entries, size=size, dist='fixed',
+                                 seed=cfg.seed)
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            res = pool.submit(run_case, depot, 'exp', 'dir', pt(tmp) / 'out' / name,
+                              cfg.jobs).result()
+        cases.append((res['entries'], res['bytes'], res['task']))
+        print(f"{name:>6}: {res['entries']} files, {res['bytes'] / 1024 ** 2:.1f} MiB "
+              f"in {res['task']:.3f} s")
+
+    (fle_1, byt_1, sec_1), (fle_2, byt_2, sec_2) = cases
+    det = fle_1 * byt_2 - fle_2 * byt_1
+    file_s, byte_s = (sec_1 * byt_2 - sec_2 * byt_1) / det, (fle_1 * sec_2 - fle_2 * sec_1) / det
+    if file_s < 0:  # noise; one of the costs is too small to tell
+        file_s, byte_s = 0.0, sec_2 / byt_2
+    elif byte_s < 0:
+        file_s, byte_s = sec_1 / fle_1, 0.0
+    cal = {'file_s': file_s, 'byte_s': byte_s, 'jobs': cfg.jobs,
+           'created': time.strftime('%Y-%m-%d %H:%M'), 'host': platform.node()}
+    cal_pt = rpakit.RPAKit.calibration_path()
+    cal_pt.parent.mkdir(parents=True, exist_ok=True)
+    cal_pt.write_text(json.dumps(cal, indent=1), encoding='utf-8')
+    print(f"{file_s * 1e6:.1f} us per file, {1 / max(byte_s, 1e-12) / 1024 ** 2:.1f} MiB/s; "
+          f"stored in {cal_pt}")
+
+
+def bench_main(cfg):
+    formats = cfg.formats.split(',')
+    tasks = cfg.tasks.split(',')
+    tmp = cfg.keep or tempfile.mkdtemp(prefix='rksuite_')
+    try:
+        if cfg.calibrate:
+            calibrate(cfg, tmp)
+            return
+        corpus = rpakit_corpus.make_corpus(
+            pt(tmp) / 'corpus', formats, entries=cfg.entries, size=cfg.size,
+            dist=cfg.dist, multi=cfg.multi, prefix=cfg.prefix, seed=cfg.seed)
+        print(f"{'format':>6} {'task':>4} {'index s':>9} {'task s':>9} "
+              f"{'entries/s':>11} {'MiB/s':>9} {'RSS MiB':>8}")
+        for fmt, (depot, _digests) in corpus.items():
+            for task in tasks:
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    res = pool.submit(run_case, depot, task, cfg.sink,
+                                      pt(tmp) / 'out' / fmt, cfg.jobs).result()
+                took = max(res['task'], 1e-9)
+                mib_s = f"{res['bytes'] / 1024 ** 2 / took:9.1f}" if task == 'exp' else f"{'-':>9}"
+                rss = f"{res['rss']:8.1f}" if res['rss'] is not None else f"{'-':>8}"
+                print(f"{fmt:>6} {task:>4} {res['index']:9.4f} {res['task']:9.4f} "
+                      f"{res['entries'] / took:11.0f} {mib_s} {rss}")
+    finally:
+        if not cfg.keep:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+def parse_args():
+    aps = argparse.ArgumentParser(description="Benchmark suite for RPA Kit on a synthetic corpus.")
+    aps.add_argument('--formats', default=','.join(rpakit_corpus.FORMATS),
+                     help='Comma separated archive formats. Default: all')
+    aps.add_argument('--tasks', default='lst,tst,exp',
+                     help='Comma separated tasks of lst, tst, exp. Default: all')
+    aps.add_argument('--sink', choices=['dir', 'null'], default='dir',
+                     help='Output of expand: real files or the null sink (read cost only).')
+    aps.add_argument('--entries', type=int, default=5000)
+    aps.add_argument('--size', type=int, default=16384, help='Mean entry size in bytes.')
+    aps.add_argument('--dist', choices=rpakit_corpus.DISTS, default='lognormal')
+    aps.add_argument('--multi', type=float, default=0.05,
+                     help='Fraction of entrys stored in two segments.')
+    aps.add_argument('--prefix', type=float, default=0.05,
+                     help='Fraction of entrys with a register prefix.')
+    aps.add_argument('--seed', type=int, default=0)
+    aps.add_argument('--jobs', type=int, default=1, help='Threads of the expand task.')
+    aps.add_argument('--keep', metavar='DIR',
+                     help='Keeps corpus and output in DIR instead of a temp dir.')
+    aps.add_argument('--calibrate', action='store_true',
+                     help='Measures the cost per file and per byte of expand and stores '
+                     'them for the plan task. Use --keep DIR on the target filesystem.')
+    return aps.parse_args()
+
+
+if __name__ == '__main__':
+    bench_main(parse_args())
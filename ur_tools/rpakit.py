@@ -12,9 +12,37 @@ import os
 import sys
 import argparse
 from pathlib import Path as pt
+import mmap
 import pickle
+import marshal
+import hashlib
+import json
+import re
+import fnmatch
+import io
+import bisect
+from collections import OrderedDict, namedtuple, deque
+from collections.abc import Mapping
+from array import array
+from stat import S_ISREG, S_ISDIR
+import threading
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, \
+    CancelledError
+import asyncio
 import zlib
+import shlex
+import shutil
+import subprocess
+import tarfile
+import zipfile
+import warnings
 import textwrap
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
 __title__ = 'RPA Kit'
@@ -23,17 +51,27 @@ __author__ = 'madeddy'
 __status__ = 'Development'
 __version__ = '0.25.0-alpha'
 
+FICLONE = 0x40049409  # linux ioctl for reflinks
+
 
 class RKC:
     """
     "Rpa Kit Common" is the base class which provides some shared methods and
-    variables for the child classes.
+    variables for the child classes. The run state (output level, counters,
+    output path) lives on the instance, so several jobs can run side by side
+    in one process. The class level `verbosity` is only the default for new
+    instances.
     """
     name = "RpaKit"
     verbosity = 1
-    count = {'dep_found': 0, 'dep_done': 0, 'fle_total': 0}
-    out_pt = None
 
+    def __init__(self):
+        self.verbosity = RKC.verbosity
+        self.count = {'dep_found': 0, 'dep_done': 0, 'fle_total': 0, 'fle_done': 0,
+                      'dd_saved': 0, 'vfy_bad': 0, 'dc_done': 0, 'dc_failed': 0,
+                      'dc_kept': 0}
+        self.out_pt = None
+        self.msg_out = None
 
     def __str__(self):
         return f"{self.__class__.__name__}({self.name!r})"
@@ -48,31 +86,88 @@ class RKC:
     def strify(cls, data):
         return str(data)
 
-    @classmethod
-    def inf(cls, inf_level, msg, m_sort=None):
+    def inf(self, inf_level, msg, m_sort=None):
         """Outputs by the current verboseness level allowed infos."""
-        if cls.verbosity >= inf_level:  # self.tty ?
-            ind1 = f"{cls.name}: > "
+        if self.verbosity >= inf_level:  # self.tty ?
+            ind1 = f"{self.name}: > "
             ind2 = " " * 12
             if m_sort == 'note':
-                ind1 = f"{cls.name}:\x1b[93m NOTE \x1b[0m> "
+                ind1 = f"{self.name}:\x1b[93m NOTE \x1b[0m> "
                 ind2 = " " * 16
             elif m_sort == 'warn':
-                ind1 = f"{cls.name}:\x1b[31m WARNING \x1b[0m> "
+                ind1 = f"{self.name}:\x1b[31m WARNING \x1b[0m> "
                 ind2 = " " * 20
             elif m_sort == 'raw':
-                print(ind1, msg)
+                print(ind1, msg, file=self.msg_out)
                 return
-            print(textwrap.fill(msg, width=90, initial_indent=ind1, subsequent_indent=ind2))
+            print(textwrap.fill(msg, width=90, initial_indent=ind1, subsequent_indent=ind2),
+                  file=self.msg_out)
 
-    @classmethod
-    def make_dirstruct(cls, dst):
+    def make_dirstruct(self, dst):
         """Constructs any needet output directorys if they not already exist."""
         if not pt(dst).exists():
-            cls.inf(2, f"Creating directory structure for: {dst}")
+            self.inf(2, f"Creating directory structure for: {dst}")
             pt(dst).mkdir(parents=True, exist_ok=True)
 
 
+class RKProgress:
+    """
+    Rate limited progress reporting. Callers only bump the counters; a message
+    is build at most `rate` times per second and only if the verbosity level
+    shows it. Optional a background thread does the output, so the terminal
+    never blocks the workers. Output level and messages are the ones of the
+    given kit.
+    """
+
+    def __init__(self, kit, total, level=2, rate=5, background=False):
+        self._kit = kit
+        self.total = max(total, 1)
+        self.done = 0
+        self.level = level
+        self._interval = 1.0 / rate if rate > 0 else 0
+        self._last = 0.0
+        self._lock = threading.Lock()
+        self._queue = None
+        self._sink = None
+        if background and kit.verbosity >= level:
+            self._queue = queue.Queue()
+            self._sink = threading.Thread(target=self._drain, daemon=True)
+            self._sink.start()
+
+    def _drain(self):
+        msg = self._queue.get()
+        while msg is not None:
+            self._kit.inf(self.level, msg)
+            msg = self._queue.get()
+
+    def _emit(self, done, name):
+        msg = f"[{done / float(self.total):05.1%}] {name:>4}"
+        if self._queue is not None:
+            self._queue.put(msg)
+        else:
+            self._kit.inf(self.level, msg)
+
+    def add(self, name, num=1):
+        """Counts done items; reports if the rate allows it."""
+        with self._lock:
+            self.done += num
+            done = self.done
+            if self._kit.verbosity < self.level:
+                return
+            now = time.monotonic()
+            if now - self._last < self._interval and done < self.total:
+                return
+            self._last = now
+        self._emit(done, name)
+
+    def close(self):
+        """Stops the background output after all queued messages are shown."""
+        if self._sink is not None:
+            self._queue.put(None)
+            self._sink.join()
+            self._sink = None
+
+
 class RPAPathwork(RKC):
     """
     Support class for RPA Kit's path related preparation. Needet inputs
@@ -87,6 +182,8 @@ class RPAPathwork(RKC):
         self._inp_pt = None
         self.raw_inp = None
         self.outdir = None
+        self.recursive = False
+        self.probes = 16
 
     def make_output(self):
         """Constructs outdir and outpath."""
@@ -94,7 +191,6 @@ class RPAPathwork(RKC):
         if self.outdir is None:
             self.outdir = 'rpakit_out'
         self.out_pt = pt(self._inp_pt) /  self.outdir
-        self.make_dirstruct(self.out_pt)
 
     def ident_paired_depot(self):
         """Identifys rpa1 type paired archives and removes one from the list."""
@@ -104,7 +200,7 @@ class RPAPathwork(RKC):
                 twin = str(pt(entry).with_suffix('.rpa'))
                 if twin in self.dep_lst:
                     self.dep_lst.remove(twin)
-                    RKC.count['dep_found'] -= 1
+                    self.count['dep_found'] -= 1
 
     @staticmethod
     def valid_archives(entry):
@@ -116,10 +212,62 @@ class RPAPathwork(RKC):
         """Adds by extension as RPA identified files to the depot list."""
         if self.valid_archives(depot):
             self.dep_lst.append(depot)
-            RKC.count['dep_found'] += 1
+            self.count['dep_found'] += 1
+
+    @staticmethod
+    def sniff_depot(path):
+        """Reads the first bytes of a file and checks them against the known RPA
+        headers. Returns the path if it is a archive, else None.
+        """
+        try:
+            with open(path, 'rb') as ofi:
+                head = ofi.read(40)
+        except OSError:
+            return None
+        for magic, val in RPAKit._rpaformats.items():  # pylint:disable=w0212
+            if val['rpaid'] in ('zix12a', 'zix12b'):
+                continue
+            if val['rpaid'] == 'rpa1':
+                if head[:1] == b'x' and pt(path).suffix == '.rpi':
+                    return path
+            elif magic.encode() in head[:12]:
+                return path
+        return None
+
+    def walk_files(self, top):
+        """Yields the paths of all files below top. The type infos of the dir
+        entrys are reused, so no extra stat per file is needet. The output dir
+        and symlinked dirs are left out.
+        """
+        skip = {str(pt(self._inp_pt) / (self.outdir or 'rpakit_out'))}
+        stack = [str(top)]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entrys:
+                    for entry in entrys:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.path not in skip:
+                                stack.append(entry.path)
+                        elif entry.is_file():
+                            yield entry.path
+            except OSError as err:
+                self.inf(2, f"{err}: Directory skipped.", m_sort='note')
+
+    def discover_rpa(self):
+        """Searches recursive below the input dir and confirms the candidates by
+        their header instead of the suffix. The header probes run concurrent.
+        """
+        with ThreadPoolExecutor(max_workers=max(self.probes, 1)) as pool:
+            for depot in pool.map(self.sniff_depot, self.walk_files(self._inp_pt)):
+                if depot is not None:
+                    self.dep_lst.append(depot)
+                    self.count['dep_found'] += 1
 
     def search_rpa(self):
         """Searches dir and calls another method which identifys RPA files."""
+        if self.recursive:
+            self.discover_rpa()
+            return
         for entry in os.scandir(self._inp_pt):
             self.add_depot(entry.path)
 
@@ -152,13 +300,187 @@ class RPAPathwork(RKC):
         self.make_output()
         self.ident_paired_depot()
 
-        if RKC.count['dep_found'] > 0:
-            self.inf(1, f"{RKC.count['dep_found']} RPA files to process:\n"
+        if self.count['dep_found'] > 0:
+            self.inf(1, f"{self.count['dep_found']} RPA files to process:\n"
                      f"{chr(10).join([*map(str, self.dep_lst)])}", m_sort='raw')
         else:
             self.inf(1, "No RPA files found. Was the correct path given?")
 
 
+class RegStream:
+    """
+    File-like reader for the unpickler which inflates the zlib compressed
+    register chunk by chunk from the depot. Consumed data is dropped, so the
+    whole compressed and decompressed register is never held at once.
+    """
+    chunk = 1 << 18
+
+    def __init__(self, ofi):
+        self._ofi = ofi
+        self._zobj = zlib.decompressobj()
+        self._buf = bytearray()
+        self._pos = 0
+
+    def _fill(self):
+        """Inflates the next chunk into the buffer. Returns False at stream end."""
+        if self._zobj.unconsumed_tail:
+            data = self._zobj.decompress(self._zobj.unconsumed_tail, self.chunk)
+        elif self._zobj.eof:
+            return False
+        else:
+            raw = self._ofi.read(self.chunk)
+            if not raw:
+                return False
+            data = self._zobj.decompress(raw, self.chunk)
+
+        if self._pos:
+            del self._buf[:self._pos]
+            self._pos = 0
+        self._buf += data
+        return True
+
+    def _take(self, end):
+        data = bytes(self._buf[self._pos:end])
+        self._pos = end
+        return data
+
+    def peek(self, size=1):
+        while len(self._buf) - self._pos < size:
+            if not self._fill():
+                break
+        return bytes(self._buf[self._pos:self._pos + size])
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buf) - self._pos < size:
+            if not self._fill():
+                break
+        return self._take(len(self._buf) if size < 0 else self._pos + size)
+
+    def readline(self):
+        idx = self._buf.find(b'\n', self._pos)
+        while idx < 0 and self._fill():
+            idx = self._buf.find(b'\n', self._pos)
+        return self._take(len(self._buf) if idx < 0 else idx + 1)
+
+
+class RegTable(Mapping):
+    """
+    Compact form of a decoded archive register. The entry names are held in one
+    table and the segments of all entrys in columns of 64 bit ints; entry `num`
+    owns the segments `first[num]:first[num + 1]`. The rare prefixes are kept
+    by segment number. The usual form `[(offset, length, prefix), ...]` of a
+    entry is built on access.
+    """
+
+    def __init__(self):
+        self.names = []
+        self._idx = {}
+        self.first = array('Q', [0])
+        self.ofs = array('Q')
+        self.leg = array('Q')
+        self.pre = {}
+
+    def __getitem__(self, name):
+        return self.entry(self._idx[name])
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._idx
+
+    def items(self):
+        return ((name, self.entry(num)) for num, name in enumerate(self.names))
+
+    def entry(self, num):
+        """Returns the segments of a entry by its number."""
+        pre = self.pre
+        return [(self.ofs[seg], self.leg[seg], pre.get(seg, b''))
+                for seg in range(self.first[num], self.first[num + 1])]
+
+    def add(self, name, segs):
+        """Appends a entry. A name which is already taken is ignored."""
+        if name in self._idx:
+            return
+        self._idx[name] = len(self.names)
+        self.names.append(name)
+        for seg in segs:
+            if len(seg) > 2 and seg[2]:
+                self.pre[len(self.ofs)] = seg[2]
+            self.ofs.append(seg[0])
+            self.leg.append(seg[1])
+        self.first.append(len(self.ofs))
+
+    @classmethod
+    def from_raw(cls, raw, key=None):
+        """Builds the table from a unpickled register. Byte names are decoded and
+        the key is applied to the whole offset and length columns at once. The
+        raw register is emptied on the way, so both are never held whole.
+        """
+        table = cls()
+        for name in list(raw):
+            table.add(RKC.utfify(name), raw.pop(name))
+        if key:
+            table.ofs = table.xor_column(table.ofs, key)
+            table.leg = table.xor_column(table.leg, key)
+        return table
+
+    @staticmethod
+    def xor_column(col, key):
+        """XORs every value of a column with the key in one operation on the
+        column's bytes taken as big int.
+        """
+        size = len(col) * col.itemsize
+        mask = int.from_bytes(key.to_bytes(col.itemsize, sys.byteorder) * len(col), sys.byteorder)
+        val = int.from_bytes(col.tobytes(), sys.byteorder) ^ mask
+        return array(col.typecode, val.to_bytes(size, sys.byteorder))
+
+    def sizes(self):
+        """Returns the extracted sizes of all entrys straight from the columns.
+        If every entry has one segment that's the length column itself.
+        """
+        first, leg = self.first, self.leg
+        if len(leg) == len(self.names):
+            return leg
+        return [sum(leg[first[num]:first[num + 1]]) for num in range(len(self.names))]
+
+    def select(self, names):
+        """Returns a new table with the given entrys."""
+        table = RegTable()
+        for name in names:
+            table.add(name, self[name])
+        return table
+
+    def by_offset(self):
+        """Returns the entrys sorted by the depot offset of their first segment."""
+        first, ofs = self.first, self.ofs
+        order = sorted(range(len(self.names)),
+                       key=lambda num: ofs[first[num]] if first[num] < first[num + 1] else 0)
+        return [(self.names[num], self.entry(num)) for num in order]
+
+    def state(self):
+        """Returns the table in a form marshal can store."""
+        return {'names': self.names,
+                'first': self.first.tobytes(),
+                'ofs': self.ofs.tobytes(),
+                'leg': self.leg.tobytes(),
+                'pre': self.pre}
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuilds a table from its stored form."""
+        table = cls()
+        table.names = state['names']
+        table._idx = {name: num for num, name in enumerate(table.names)}
+        for col in ('first', 'ofs', 'leg'):
+            setattr(table, col, array('Q', state[col]))
+        table.pre = state['pre']
+        return table
+
+
 class RPAKit(RKC):
     """
     The class for analyzing and unpacking RPA files. All needet inputs
@@ -206,8 +528,47 @@ class RPAKit(RKC):
         self.depot = None
         self._header = None
         self._version = {}
-        self._reg = {}
+        self._reg = RegTable()
         self.dep_initstate = None
+        self._dep_fd = None
+        self._dep_map = None
+        self._dep_view = None
+        self.copy_modes = [mode for mode in ('copy_file_range', 'sendfile')
+                           if hasattr(os, mode)]
+        self._reg_dirs = set()
+        self._progress = None
+        self.progress_rate = 5
+        self.progress_bg = False
+        self._lock = threading.Lock()
+        self.jobs = 1
+        self.cache_dir = None
+        self.cache_limit = 512 * 1024 ** 2
+        self.resume = True
+        self.include = []
+        self.exclude = []
+        self.dedupe = False
+        self.replace_out = False
+        self.link_modes = ['hardlink']
+        if fcntl is not None and sys.platform.startswith('linux'):
+            self.link_modes.insert(0, 'reflink')
+        self._dd_index = {}
+        self._dd_paths = {}
+        self._dd_saved = 0
+        self.run_size = 4 * 1024 ** 2
+        self.run_gap = 64 * 1024
+        self.prealloc_min = 1024 ** 2
+        self.advise_size = 16 * 1024 ** 2
+        self.stream_min = 32 * 1024 ** 2
+        self.stream_block = 1024 ** 2
+        self.sink = None
+        self.decomp = None
+        self.halt = threading.Event()
+        self._manifest = {}
+        self._man_file = None
+        self.hash_algo = 'blake2b'
+        self._hashes = {}
+        self._vfy_bad = 0
+        self._plan = {}
 
     def clear_rk_vars(self):
         """This clears some vars. In rare cases nothing is assigned and old values
@@ -215,40 +576,200 @@ class RPAKit(RKC):
         """
         self._header = None
         self._version.clear()
-        self._reg.clear()
+        self._reg = RegTable()
+        self._reg_dirs.clear()
         self.dep_initstate = None
 
-    def extract_data(self, file_pt, file_data):
-        """Extracts the archive data to a temp file."""
-        if pt(self.depot).suffix == '.rpi':
-            self.depot = pt(self.depot).with_suffix('.rpa')
+    @staticmethod
+    def data_path(depot):
+        """Returns the file which holds the depot's data; for RPA-1 that's the
+        `.rpa` twin of the `.rpi` index.
+        """
+        if pt(depot).suffix == '.rpi':
+            return pt(depot).with_suffix('.rpa')
+        return pt(depot)
 
-        with pt(self.depot).open('rb') as ofi:
-            if len(self._reg[file_pt]) == 1:
-                ofs, leg, pre = file_data[0]
-                ofi.seek(ofs)
-                tmp_file = pre + ofi.read(leg - len(pre))
-            else:
-                part = []
-                for ofs, leg, pre in file_data:
-                    ofi.seek(ofs)
-                    part.append(ofi.read(leg))
-                    tmp_file = pre.join(part)
-
-        return tmp_file
-
-    def unscrample_reg(self, key):
-        """Unscrambles the archive register."""
-        for _kv in self._reg:
-            self._reg[_kv] = [(ofs ^ key, leg ^ key, pre)
-                              for ofs, leg, pre in self._reg[_kv]]
-
-    def unify_reg(self):
-        """Arrange the register in common form."""
-        for val in self._reg.values():
-            if len(val[0]) == 2:
-                for num, _ in enumerate(val):
-                    val[num] += (b'',)
+    def map_depot(self):
+        """Maps the depot's data file once into memory for the extraction run. The
+        file stays open for the kernel side copy path.
+        """
+        self.depot = self.data_path(self.depot)
+
+        self._dep_fd = os.open(self.depot, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        if os.fstat(self._dep_fd).st_size == 0:
+            self._dep_view = memoryview(b'')  # a empty file can't be mapped
+            return
+        self._dep_map = mmap.mmap(self._dep_fd, 0, access=mmap.ACCESS_READ)
+        self._dep_view = memoryview(self._dep_map)
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(self._dep_fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        if hasattr(self._dep_map, 'madvise'):
+            self._dep_map.madvise(mmap.MADV_SEQUENTIAL)
+
+    def advise_run(self, start, size):
+        """Tells the kernel that a byte range of the depot is needet soon."""
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(self._dep_fd, start, size, os.POSIX_FADV_WILLNEED)
+
+    def advise_ahead(self, spans):
+        """Yields the numbers of the runs with the given depot spans in order.
+        Before a run is yielded the runs from it on are hinted to the kernel,
+        till `advise_size` bytes ahead are covered. So the readahead is a
+        bounded window in front of the run at hand, which is never evicted
+        before it's read. Of large runs only the head is hinted.
+        """
+        ahead = window = 0
+        for num, (_start, size) in enumerate(spans):
+            while ahead < len(spans) and (ahead <= num or window < self.advise_size):
+                start, hint = spans[ahead][0], min(spans[ahead][1], self.advise_size)
+                self.advise_run(start, hint)
+                window += hint
+                ahead += 1
+            yield num
+            window -= min(size, self.advise_size)
+
+    def read_run(self, start, size):
+        """Reads a byte range of the depot with one sequential read."""
+        if hasattr(os, 'pread'):
+            return os.pread(self._dep_fd, size, start)
+        return self._dep_view[start:start + size].tobytes()
+
+    def unmap_depot(self):
+        """Releases the view and the mapping of the depot."""
+        if self._dep_view is not None:
+            self._dep_view.release()
+            self._dep_view = None
+        if self._dep_map is not None:
+            self._dep_map.close()
+            self._dep_map = None
+        if self._dep_fd is not None:
+            os.close(self._dep_fd)
+            self._dep_fd = None
+
+    def drop_mode(self, modes, mode):
+        """Removes a copy or link mode which failed on this system or filesystem."""
+        with self._lock:
+            if mode in modes:
+                modes.remove(mode)
+                self.inf(2, f"`{mode}` is unusable here. Falling back.", m_sort='note')
+
+    def kernel_copy(self, ofi, ofs, leg):
+        """Copies a byte range of the depot in kernel space to the output file, so
+        the data never enters the python heap. Returns the number of copied bytes,
+        which is less as requested if no copy mode works.
+        """
+        done = 0
+        dst_fd = ofi.fileno()
+        while done < leg and self.copy_modes:
+            mode = self.copy_modes[0]
+            try:
+                if mode == 'copy_file_range':
+                    num = os.copy_file_range(self._dep_fd, dst_fd, leg - done,
+                                             offset_src=ofs + done)
+                else:
+                    num = os.sendfile(dst_fd, self._dep_fd, ofs + done, leg - done)
+            except OSError:
+                self.drop_mode(self.copy_modes, mode)
+                continue
+            if num == 0:
+                break
+            done += num
+        return done
+
+    @staticmethod
+    def entry_segs(file_data):
+        """Returns the prefix and the depot ranges of a entry's data."""
+        if len(file_data) == 1:
+            ofs, leg, pre = file_data[0]
+            return pre, [(ofs, leg - len(pre))]
+        return b'', [(ofs, leg) for ofs, leg, _pre in file_data]
+
+    def iter_blocks(self, segs):
+        """Yields the data of depot ranges in blocks of fixed size, read into one
+        reused buffer. A block is only valid till the next one is read.
+        """
+        view = memoryview(bytearray(self.stream_block))
+        for ofs, leg in segs:
+            end = ofs + leg
+            while ofs < end:
+                self.check_halt()
+                size = min(len(view), end - ofs)
+                if hasattr(os, 'preadv'):
+                    data = view[:os.preadv(self._dep_fd, [view[:size]], ofs)]
+                elif hasattr(os, 'pread'):
+                    data = os.pread(self._dep_fd, size, ofs)
+                else:
+                    data = self._dep_view[ofs:ofs + size]
+                if not data:
+                    return
+                yield data
+                ofs += len(data)
+
+    def check_halt(self):
+        """Stops the work of a worker thread once a halt is requested. The entry
+        in work is left unrecorded, so a resumed run writes it again.
+        """
+        if self.halt.is_set():
+            raise CancelledError("The extraction was halted.")
+
+    @staticmethod
+    def write_vec(dst_fd, bufs):
+        """Writes the buffers with one vectored write where the system has it.
+        Partial writes are continued.
+        """
+        bufs = [memoryview(buf) for buf in bufs if len(buf)]
+        while bufs:
+            num = os.writev(dst_fd, bufs) if hasattr(os, 'writev') else os.write(dst_fd, bufs[0])
+            while num:
+                if num < len(bufs[0]):
+                    bufs[0] = bufs[0][num:]
+                    break
+                num -= len(bufs.pop(0))
+
+    def stream_data(self, ofi, pre, segs, direct=True):
+        """Copies a large entry block by block through one buffer, so the memory
+        needet is independent of the entry size. The prefix goes out with the
+        first block in one vectored write.
+        """
+        if not direct:
+            ofi.write(pre)
+            for block in self.iter_blocks(segs):
+                ofi.write(block)
+            return
+        ofi.flush()
+        dst_fd = ofi.fileno()
+        head = [pre]
+        for block in self.iter_blocks(segs):
+            self.write_vec(dst_fd, head + [block])
+            head = []
+        self.write_vec(dst_fd, head)
+
+    def extract_data(self, ofi, file_data, run=None, direct=True):
+        """Writes the archive data of a entry from the mapped depot to the given
+        file. The data is passed as slices of the mapping, so nothing is copied.
+        Single segment entrys without prefix are copied by the kernel if possible.
+        Entrys of a coalesced run are sliced from its already read buffer and
+        entrys from `stream_min` on are streamed in blocks. Without `direct` the
+        file descriptor of ofi is never used.
+        """
+        pre, segs = self.entry_segs(file_data)
+        if run is not None:
+            start, view = run
+            ofs, leg = segs[0]
+            ofi.write(pre)
+            ofi.write(view[ofs - start:ofs - start + leg])
+            return
+        if direct and len(file_data) == 1 and not pre and self.copy_modes:
+            ofs, leg = segs[0]
+            done = self.kernel_copy(ofi, ofs, leg)
+            segs = [(ofs + done, leg - done)]
+
+        if len(pre) + sum(leg for _ofs, leg in segs) >= self.stream_min:
+            self.stream_data(ofi, pre, segs, direct)
+            return
+        ofi.write(pre)
+        for ofs, leg in segs:
+            ofi.write(self._dep_view[ofs:ofs + leg])
 
     def get_cipher(self):
         """Fetches the cipher for the register from the header infos."""
@@ -271,17 +792,21 @@ class RPAKit(RKC):
         return offset, key
 
     def collect_register(self):
-        """Gets the depot's register through unzip and unpickle."""
+        """Gets the depot's register through unzip and unpickle. Both are streamed,
+        so the compressed and inflated data are released while unpickling. The
+        register is then stored compact and unscrambled as `RegTable`.
+        """
         offset, key = self.get_cipher()
         with pt(self.depot).open('rb') as ofi:
             ofi.seek(offset)
-            self._reg = pickle.loads(zlib.decompress(ofi.read()), encoding='bytes')
+            raw = pickle.Unpickler(RegStream(ofi), encoding='bytes').load()
 
-        self.unify_reg()
-        if key is not None:
-            if 'key2' in self._version.keys():
-                key = key ^ self._version['key2']
-            self.unscrample_reg(key)
+        if key is not None and 'key2' in self._version.keys():
+            key = key ^ self._version['key2']
+        try:
+            self._reg = RegTable.from_raw(raw, key)
+        except (OverflowError, TypeError, IndexError) as err:
+            raise ValueError(f"{err}: The register of {self.depot} is malformed.")
 
     def get_version_specs(self):
         """Yields for the given archive version the cipher data."""
@@ -345,37 +870,710 @@ class RPAKit(RKC):
             ofi.seek(0)
             self._header = ofi.readline()
 
+    def collect_reg_dirs(self):
+        """Collects the directorys the register's file paths imply. Entrys whose
+        path is one of them can't be written as file and must be renamed.
+        """
+        for file_pt in self._reg:
+            parts = file_pt.split('/')
+            for num in range(1, len(parts)):
+                self._reg_dirs.add('/'.join(parts[:num]))
+
+    def bad_name(self, taken=()):
+        """Returns a random replacement name for a unusable entry path."""
+        rand_fn = '0_' + os.urandom(2).hex() + '.BAD'
+        while rand_fn in taken or pt(self.out_pt / rand_fn).exists():
+            rand_fn = '0_' + os.urandom(3).hex() + '.BAD'
+        self.inf(2, f"Possible invalid archive! A filename was replaced with the new name '{rand_fn}'.")
+        return rand_fn
+
     def check_out_pt(self, f_pt):
         """Checks output path and if needet renames file."""
         tmp_pt = pt(self.out_pt / f_pt)
-        if pt(tmp_pt).is_dir() or f_pt == "":
-            rand_fn = '0_' + os.urandom(2).hex() + '.BAD'
-            tmp_pt = pt(self.out_pt / rand_fn)
-            self.inf(2, f"Possible invalid archive! A filename was replaced with the new name '{rand_fn}'.")
+        if f_pt in self._reg_dirs or pt(tmp_pt).is_dir() or f_pt == "":
+            tmp_pt = pt(self.out_pt / self.bad_name())
         return tmp_pt
 
-    def unpack_depot(self):
-        """Manages the unpacking of the depot files."""
-        for file_num, (file_pt, file_data) in enumerate(self._reg.items()):
+    def plan_names(self):
+        """Resolves the output names of all entrys in one pass; unusable ones get
+        a replacement name. Returns the names by entry and the directorys they
+        imply.
+        """
+        plan, dirs, taken = {}, set(), set()
+        for file_pt in self._reg:
+            if file_pt in self._reg_dirs or file_pt == "":
+                rel_pt = self.bad_name(taken)
+                taken.add(rel_pt)
+            else:
+                rel_pt = file_pt
+                parts = file_pt.split('/')
+                for num in range(1, len(parts)):
+                    dirs.add('/'.join(parts[:num]))
+            plan[file_pt] = rel_pt
+        return plan, dirs
+
+    def plan_output(self):
+        """Plans the output tree of the register in one pass. Resolves the paths
+        and renames of all entrys and creates every needet directory once, so
+        writing a entry needs no further metadata calls. Returns the output
+        path by entry name.
+        """
+        names, dirs = self.plan_names()
+        plan = {file_pt: pt(self.out_pt) / rel_pt for file_pt, rel_pt in names.items()}
+
+        self.make_dirstruct(self.out_pt)
+        for rel_dir in sorted(dirs, key=len):
+            try:
+                os.mkdir(pt(self.out_pt) / rel_dir)
+                self.inf(2, f"Created directory: {rel_dir}")
+            except FileExistsError:
+                pass
+        return plan
+
+    def open_output(self, tmp_path):
+        """Opens a output file. If a directory on disk blocks the path a
+        replacement name is used.
+        """
+        try:
+            return pt(tmp_path).open('wb')
+        except (IsADirectoryError, PermissionError):
+            if not pt(tmp_path).is_dir():
+                raise
+        return pt(self.out_pt / self.bad_name()).open('wb')
+
+    @staticmethod
+    def part_path(tmp_path):
+        """Returns a unique name beside a output file to write it under first."""
+        return pt(tmp_path).with_name(f".{os.urandom(6).hex()}.rkpart")
+
+    def replace_output(self, part, tmp_path):
+        """Moves a completely written part file over its output path in one step,
+        so concurrent writers of the same path leave one whole file. Returns
+        the path the file got.
+        """
+        try:
+            os.replace(part, tmp_path)
+        except (IsADirectoryError, PermissionError):
+            if not pt(tmp_path).is_dir():
+                raise
+            tmp_path = self.out_pt / self.bad_name()
+            os.replace(part, tmp_path)
+        return str(tmp_path)
+
+    @staticmethod
+    def entry_size(file_data):
+        """Returns the size a entry has when extracted."""
+        if len(file_data) == 1:
+            return file_data[0][1]
+        return sum(leg for _ofs, leg, _pre in file_data)
+
+    def manifest_path(self, kind='manifest'):
+        """Returns the path of the depot's extraction or hash manifest in the
+        output dir. It's named after the data file, so it's the same before and
+        after the depot is mapped.
+        """
+        data_pt = self.data_path(self.depot)
+        dep_id = hashlib.sha1(os.fsencode(str(data_pt.resolve()))).hexdigest()[:8]
+        return pt(self.out_pt) / '.rpakit' / f"{data_pt.name}.{dep_id}.{kind}"
+
+    @staticmethod
+    def load_manifest(man_pt):
+        """Yields the records of a manifest file, if there is one."""
+        try:
+            with pt(man_pt).open('r', encoding='utf-8') as ofi:
+                for line in ofi:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue  # a interrupted run can leave a partial line
+        except FileNotFoundError:
+            return
+
+    def open_manifest(self):
+        """Reads the records of entrys completed in a previous run and starts the
+        manifest of this run with them.
+        """
+        self._manifest.clear()
+        man_pt = self.manifest_path()
+        if self.resume:
+            self._manifest.update((rec['name'], rec) for rec in self.load_manifest(man_pt)
+                                  if rec.get('done'))
+
+        self.make_dirstruct(man_pt.parent)
+        self._man_file = man_pt.open('w', encoding='utf-8')
+        for file_pt, rec in self._manifest.items():
+            if file_pt not in self._reg:  # kept for runs with other filters
+                self.record_entry(rec)
+
+    def close_manifest(self):
+        if self._man_file is not None:
+            self._man_file.close()
+            self._man_file = None
+
+    def record_entry(self, rec):
+        """Writes the record of a completed entry to the manifest."""
+        line = json.dumps(rec) + '\n'
+        with self._lock:
+            self._man_file.write(line)
+
+    def entry_done(self, file_pt, file_data):
+        """Checks if a entry was completely extracted in a previous run and its
+        output file is since unchanged in size and mtime.
+        """
+        rec = self._manifest.get(file_pt)
+        if rec is None or rec['ofs'] != file_data[0][0] \
+                or rec['len'] != self.entry_size(file_data) or 'mtime' not in rec:
+            return False
+        try:
+            stat = os.stat(pt(self.out_pt) / rec['out'])
+        except OSError:
+            return False
+        return stat.st_size == rec['len'] and stat.st_mtime_ns == rec['mtime']
+
+    def count_entry(self, file_pt):
+        """Counts a entry as done for the progress report."""
+        self._progress.add(file_pt)
+
+    @staticmethod
+    def new_hash(algo=None):
+        """Returns a hash object of the given algorithm; default is the short
+        blake2b of the dedupe index.
+        """
+        if algo is None:
+            return hashlib.blake2b(digest_size=20)
+        return hashlib.new(algo)
+
+    def entry_digest(self, file_data, algo=None):
+        """Hashes the data of a entry straight from the depot mapping. Large
+        entrys are read in blocks instead.
+        """
+        hsh = self.new_hash(algo)
+        pre, segs = self.entry_segs(file_data)
+        hsh.update(pre)
+        if self.entry_size(file_data) >= self.stream_min:
+            for block in self.iter_blocks(segs):
+                hsh.update(block)
+        else:
+            for ofs, leg in segs:
+                hsh.update(self._dep_view[ofs:ofs + leg])
+        return hsh.digest()
+
+    @classmethod
+    def file_digest(cls, path, algo=None):
+        """Hashes a already written output file. Returns None if it's unreadable."""
+        hsh = cls.new_hash(algo)
+        try:
+            with open(path, 'rb') as ofi:
+                for chunk in iter(lambda: ofi.read(1024 ** 2), b''):
+                    hsh.update(chunk)
+        except OSError:
+            return None
+        return hsh.digest()
+
+    def find_duplicate(self, file_data, size):
+        """Searches a written file with the same content as the entry. Only files
+        of the same size are candidates and hashed, the others never. Returns the
+        path of the duplicate or None and the entry's digest if it was needet.
+        """
+        with self._lock:
+            cands = list(self._dd_index.get(size, ()))
+        if not cands:
+            return None, None
+
+        digest = self.entry_digest(file_data)
+        for cand in cands:
+            if cand[0] is None:
+                cand[0] = self.file_digest(cand[1])
+            if cand[0] == digest:
+                return cand[1], digest
+        return None, digest
+
+    def drop_output(self, tmp_path):
+        """Drops a file from the dedupe index before its content is replaced."""
+        with self._lock:
+            old = self._dd_paths.pop(str(tmp_path), None)
+            if old is not None:
+                self._dd_index[old[0]].remove(old[1])
+
+    def index_output(self, tmp_path, size, digest):
+        """Adds a completely written and closed file to the dedupe index. A former
+        file on that path is dropped from it, since its content is gone.
+        """
+        cand = [digest, str(tmp_path)]
+        self.drop_output(tmp_path)
+        with self._lock:
+            self._dd_index.setdefault(size, []).append(cand)
+            self._dd_paths[cand[1]] = (size, cand)
+
+    def link_file(self, src, dst):
+        """Creates dst as reflink of src where the filesystem supports it, else as
+        hardlink. Returns False if neither works.
+        """
+        while self.link_modes:
+            mode = self.link_modes[0]
             try:
-                tmp_path = self.check_out_pt(file_pt)
-                self.make_dirstruct(pt(tmp_path).parent)
+                if mode == 'reflink':
+                    with open(src, 'rb') as sfi, open(dst, 'wb') as dfi:
+                        fcntl.ioctl(dfi.fileno(), FICLONE, sfi.fileno())
+                else:
+                    os.link(src, dst)
+                return True
+            except OSError:
+                if pt(dst).exists():
+                    os.unlink(dst)
+                self.drop_mode(self.link_modes, mode)
+        return False
+
+    def dedupe_entry(self, tmp_path, file_data, size):
+        """Links the output to a earlier written duplicate. Returns the mtime of the
+        linked file or None if the entry must be written and the entry's digest,
+        if it was needet.
+        """
+        src, digest = self.find_duplicate(file_data, size)
+        if src is not None and self.link_file(src, tmp_path):
+            with self._lock:
+                self._dd_saved += size
+            return os.stat(tmp_path).st_mtime_ns, digest
+        return None, digest
+
+    def unshare_output(self, tmp_path):
+        """Removes a former output file which shares its content with other files
+        by a hardlink, so the new one never writes through into them. In dedupe
+        mode a former file is always removed, as it may be a link target.
+        """
+        try:
+            stat = os.lstat(tmp_path)
+        except FileNotFoundError:
+            return
+        if S_ISDIR(stat.st_mode):
+            return
+        if self.dedupe:
+            self.drop_output(tmp_path)
+        if self.dedupe or (S_ISREG(stat.st_mode) and stat.st_nlink > 1):
+            os.unlink(tmp_path)
+
+    def preallocate(self, ofi, size):
+        """Reserves the space of a large output file in one go, so the filesystem
+        can place it contiguous. Returns True if it was done.
+        """
+        if size < self.prealloc_min or not hasattr(os, 'posix_fallocate'):
+            return False
+        try:
+            os.posix_fallocate(ofi.fileno(), 0, size)
+        except OSError:
+            return False
+        return True
+
+    def write_entry(self, tmp_path, file_pt, file_data, run=None):
+        """Writes one entry to its output file, records and counts it as done.
+        In dedupe mode a duplicate is linked instead. Safe to run concurrent in
+        worker threads.
+        """
+        self.check_halt()
+        size = self.entry_size(file_data)
+        mtime = digest = None
+        self.unshare_output(tmp_path)
+        if self.dedupe and size > 0:
+            mtime, digest = self.dedupe_entry(tmp_path, file_data, size)
+
+        if mtime is None:
+            part = self.part_path(tmp_path) if self.replace_out else None
+            try:
+                with self.open_output(part or tmp_path) as ofi:
+                    prealloc = self.preallocate(ofi, size)
+                    self.extract_data(ofi, file_data, run)
+                    if prealloc and ofi.tell() != size:
+                        ofi.truncate()
+                    ofi.flush()
+                    mtime = os.fstat(ofi.fileno()).st_mtime_ns
+                tmp_path = ofi.name if part is None else self.replace_output(part, tmp_path)
+            except BaseException:
+                if part is not None and part.exists():
+                    part.unlink()
+                raise
+            if self.dedupe and size > 0:
+                self.index_output(tmp_path, size, digest)
+
+        self.record_entry({'name': file_pt,
+                           'ofs': file_data[0][0],
+                           'len': size,
+                           'mtime': mtime,
+                           'out': pt(tmp_path).relative_to(self.out_pt).as_posix(),
+                           'done': True})
+        self.count_entry(file_pt)
+        self.hand_over(file_pt, tmp_path)
+
+    def decompile_wanted(self, file_pt):
+        """Checks if a entry is a compiled script the decompiler stage takes. If
+        the archive holds its source too, the source is used as is.
+        """
+        if self.decomp is None or not file_pt.endswith(RKDecompiler.scripts):
+            return False
+        return RKDecompiler.source_name(file_pt) not in self._reg
 
-                tmp_file = self.extract_data(file_pt, file_data)
-                self.inf(2, f"[{file_num / float(RKC.count['fle_total']):05.1%}] " \
-                         f"{file_pt:>4}")
+    def hand_over(self, file_pt, out_path):
+        """Passes a extracted script to the decompiler stage, if it's wanted."""
+        if self.decompile_wanted(file_pt) and str(out_path).endswith(RKDecompiler.scripts):
+            self.decomp.put(out_path)
 
-                with pt(tmp_path).open('wb') as ofi:
-                    ofi.write(tmp_file)
-            except TypeError as err:
-                raise f"{err}: Unknown error while trying to extract a file."
+    @staticmethod
+    def entry_span(file_data):
+        """Returns start and end of a single segment entry's data in the depot."""
+        ofs, leg, pre = file_data[0]
+        return ofs, ofs + leg - len(pre)
+
+    def plan_runs(self, items=None):
+        """Sorts the entrys by their depot offset and groups close neighbours to
+        runs, which are later read with one sequential read. Multi segment
+        entrys and entrys larger as a run stay alone. Given items must be
+        already in offset order.
+        """
+        runs = []
+        run, run_start, run_end = [], 0, 0
+        for item in self._reg.by_offset() if items is None else items:
+            file_data = item[1]
+            if len(file_data) != 1:
+                runs.append([item])
+                continue
+            start, end = self.entry_span(file_data)
+            if run and start - run_end <= self.run_gap and end - run_start <= self.run_size:
+                run.append(item)
+                run_end = max(run_end, end)
+            else:
+                if run:
+                    runs.append(run)
+                run, run_start, run_end = [item], start, end
+        if run:
+            runs.append(run)
+        return runs
 
-        if any(pt(self.out_pt).iterdir()):
-            self.inf(2, f"Unpacked {RKC.count['fle_total']} files from archive: " \
+    @staticmethod
+    def run_span(items):
+        """Returns start and size of the depot range the entrys of a run cover."""
+        segs = [(ofs, ofs + leg - len(pre)) for _tp, _fp, file_data in items
+                for ofs, leg, pre in file_data]
+        start = min(seg[0] for seg in segs)
+        return start, max(seg[1] for seg in segs) - start
+
+    def write_run(self, items):
+        """Writes the entrys of a run. Several entrys are read together with one
+        read and then split in memory.
+        """
+        if len(items) == 1:
+            self.write_entry(*items[0])
+            return
+        start, size = self.run_span(items)
+        buf = self.read_run(start, size)
+        with memoryview(buf) as view:
+            for tmp_path, file_pt, file_data in items:
+                self.write_entry(tmp_path, file_pt, file_data, run=(start, view))
+
+    def sink_run(self, items, mtime):
+        """Adds the entrys of a run to the sink; like `write_run` with one read
+        for several entrys.
+        """
+        if len(items) == 1:
+            name, file_pt, file_data = items[0]
+            self.sink.add(self, name, file_data, mtime=mtime)
+            self.count_entry(file_pt)
+            return
+        start, size = self.run_span(items)
+        buf = self.read_run(start, size)
+        with memoryview(buf) as view:
+            for name, file_pt, file_data in items:
+                self.sink.add(self, name, file_data, run=(start, view), mtime=mtime)
+                self.count_entry(file_pt)
+
+    def sink_depot(self):
+        """Streams the entrys of the depot in offset order into the output
+        archive of the sink instead of the output dir. A single output stream
+        allows no parallel writes, so the runs are processed one after the
+        other; resume and dedupe don't apply.
+        """
+        self._progress = RKProgress(self, len(self._reg), rate=self.progress_rate,
+                                    background=self.progress_bg)
+        names, _dirs = self.plan_names()
+        mtime = os.stat(self.depot).st_mtime
+        self.map_depot()
+        try:
+            runs = [[(names[file_pt], file_pt, file_data) for file_pt, file_data in run]
+                    for run in self.plan_runs()]
+            for num in self.advise_ahead([self.run_span(_it) for _it in runs]):
+                self.sink_run(runs[num], mtime)
+        finally:
+            self._progress.close()
+            self.unmap_depot()
+
+        self.inf(2, f"Streamed {self._progress.done} files from archive " \
+                 f"{self.strify(self.depot)} into {self.sink.target}.")
+
+    def plan_unpack(self):
+        """Prepares the extraction of the depot: maps it, starts the manifest and
+        plans the output tree and the runs. With a decompiler stage the
+        scripts come first. Entrys the manifest of a previous run lists as
+        complete are recorded again and skipped. Returns the runs left to
+        write as lists of output path, name and entry data and the number of
+        skipped entrys.
+        """
+        if not self._reg_dirs:
+            self.collect_reg_dirs()
+        self._progress = RKProgress(self, len(self._reg), rate=self.progress_rate,
+                                    background=self.progress_bg)
+        self._dd_saved = 0
+        self.halt.clear()
+        self.map_depot()
+        self.open_manifest()
+        todo, fle_skip, seen = [], 0, set()
+        try:
+            out_plan = self.plan_output()
+            self.check_halt()
+            if self.decomp is not None:
+                entrys = self._reg.by_offset()
+                runs = self.plan_runs([_it for _it in entrys if self.decompile_wanted(_it[0])]) \
+                    + self.plan_runs([_it for _it in entrys if not self.decompile_wanted(_it[0])])
+            else:
+                runs = self.plan_runs()
+
+            for run in runs:
+                self.check_halt()
+                items = []
+                for file_pt, file_data in run:
+                    seen.add(file_pt)
+                    if self.entry_done(file_pt, file_data):
+                        self.record_entry(self._manifest[file_pt])
+                        self.count_entry(file_pt)
+                        self.hand_over(file_pt, pt(self.out_pt) / self._manifest[file_pt]['out'])
+                        fle_skip += 1
+                        continue
+
+                    items.append((out_plan[file_pt], file_pt, file_data))
+                if items:
+                    todo.append(items)
+        except CancelledError:
+            # the unchecked records are kept; the next run checks them
+            for file_pt, rec in self._manifest.items():
+                if file_pt in self._reg and file_pt not in seen:
+                    self.record_entry(rec)
+            raise
+        return todo, fle_skip
+
+    def end_unpack(self):
+        """Closes progress, manifest and depot mapping of a extraction."""
+        self._progress.close()
+        self.close_manifest()
+        self.unmap_depot()
+
+    def unpack_msg(self, fle_skip):
+        """Reports the outcome of a extraction."""
+        if self._progress.done:
+            self.inf(2, f"Unpacked {self._progress.done} files from archive: " \
                      f"{self.strify(self.depot)}")
+            if fle_skip:
+                self.inf(2, f"{fle_skip} of them were already complete and skipped.")
+            if self._dd_saved:
+                self.inf(2, f"Duplicates were linked; {self._dd_saved} bytes saved.")
         else:
             self.inf(2, "No files from archive unpacked.")
 
+    def write_runs(self, runs):
+        """Writes the runs in order. With more as one job at most two runs per
+        job are in the pool at a time. On any error or interrupt the workers
+        are halted at their next entry or block and the queued runs dropped,
+        so the pool ends at once.
+        """
+        jobs = deque()
+        with ThreadPoolExecutor(max_workers=max(self.jobs, 1)) as pool:
+            try:
+                for num in self.advise_ahead([self.run_span(_it) for _it in runs]):
+                    items = runs[num]
+                    if self.jobs <= 1:
+                        self.write_run(items)
+                        continue
+                    jobs.append(pool.submit(self.write_run, items))
+                    while len(jobs) >= 2 * self.jobs:
+                        jobs.popleft().result()
+                while jobs:
+                    jobs.popleft().result()
+            except BaseException:
+                self.halt.set()
+                for job in jobs:
+                    job.cancel()
+                raise
+
+    def unpack_depot(self):
+        """Manages the unpacking of the depot files. The entrys are processed in
+        offset order as runs of coalesced reads. With more as one job the runs
+        are spread over a thread pool which shares the depot mapping.
+        Entrys the manifest of a previous run lists as complete are skipped.
+        With a sink set the entrys go into its archive instead. With a
+        decompiler stage the scripts are extracted first and handed over to it,
+        while the other entrys follow.
+        """
+        if not self._reg_dirs:
+            self.collect_reg_dirs()
+        if self.sink is not None:
+            self.sink_depot()
+            return
+        fle_skip = 0
+        try:
+            runs, fle_skip = self.plan_unpack()
+            self.write_runs(runs)
+        except TypeError as err:
+            raise Exception(f"{err}: Unknown error while trying to extract a file.")
+        finally:
+            if self._progress is not None:
+                self.end_unpack()
+
+        self.unpack_msg(fle_skip)
+
+    def verify_entry(self, item):
+        """Hashes one entry from the depot and compares its output file. A file
+        which the hash manifest of a previous run lists as matching is only read
+        again if its size or mtime changed. Returns the hash record and if the
+        file was read.
+        """
+        file_pt, file_data = item
+        size = self.entry_size(file_data)
+        rec = {'name': file_pt,
+               'len': size,
+               'hash': self.hash_algo,
+               'digest': self.entry_digest(file_data, self.hash_algo).hex(),
+               'out': None,
+               'mtime': None,
+               'status': 'missing'}
+        ext = self._manifest.get(file_pt)
+        rec_out = ext['out'] if ext else file_pt
+        try:
+            stat = os.stat(pt(self.out_pt) / rec_out)
+        except OSError:
+            return rec, False
+        if not S_ISREG(stat.st_mode):
+            return rec, False
+
+        rec['out'], rec['mtime'] = rec_out, stat.st_mtime_ns
+        old = self._hashes.get(file_pt)
+        if stat.st_size != size:
+            rec['status'] = 'size'
+        elif old and old['status'] == 'ok' and all(old[_k] == rec[_k] for _k in
+                                                  ('hash', 'digest', 'out', 'mtime')):
+            rec['status'] = 'ok'
+        else:
+            digest = self.file_digest(pt(self.out_pt) / rec_out, self.hash_algo)
+            rec['status'] = 'ok' if digest is not None and digest.hex() == rec['digest'] \
+                else 'differs'
+            return rec, True
+        return rec, False
+
+    def has_output(self):
+        """Checks if the output dir holds a extracted tree. The `.rpakit` dir
+        alone doesn't count, as a hash only verify creates it too.
+        """
+        if self.manifest_path().exists():
+            return True
+        try:
+            with os.scandir(self.out_pt) as ents:
+                return any(ent.name != '.rpakit' for ent in ents)
+        except (FileNotFoundError, NotADirectoryError):
+            return False
+
+    def verify_depot(self):
+        """Streams all entrys of the depot through the hash in parallel, without
+        writing them, and compares the output dir against the digests. The
+        results are written as hash manifest next to the extraction manifest.
+        """
+        self._progress = RKProgress(self, len(self._reg), rate=self.progress_rate,
+                                    background=self.progress_bg)
+        self._vfy_bad = 0
+        fle_read = 0
+        self.map_depot()
+        compare = self.has_output()
+        self._manifest.clear()
+        self._manifest.update((rec['name'], rec) for rec in
+                              self.load_manifest(self.manifest_path()) if rec.get('done'))
+        hash_pt = self.manifest_path('hashes')
+        self._hashes = {rec['name']: rec for rec in self.load_manifest(hash_pt)}
+        tmp_file = hash_pt.with_suffix(f'.{os.getpid()}.tmp')
+        try:
+            self.make_dirstruct(hash_pt.parent)
+            with tmp_file.open('w', encoding='utf-8') as ofi, \
+                    ThreadPoolExecutor(max_workers=max(self.jobs, 1)) as pool:
+                items = self._reg.by_offset()
+                for rec, reread in pool.map(self.verify_entry, items):
+                    if not compare:
+                        rec['status'] = None
+                    elif rec['status'] != 'ok':
+                        self._vfy_bad += 1
+                        self.inf(1, f"{rec['name']}: {rec['status']}", m_sort='warn')
+                    fle_read += reread
+                    ofi.write(json.dumps(rec) + '\n')
+                    self.count_entry(rec['name'])
+            os.replace(tmp_file, hash_pt)
+        finally:
+            self._progress.close()
+            self.unmap_depot()
+            self._hashes.clear()
+            if tmp_file.exists():
+                tmp_file.unlink()
+
+        self.inf(2, f"Hashed {self._progress.done} files of archive: {self.strify(self.depot)}")
+        if compare:
+            self.inf(2, f"{fle_read} output files were read, the others are unchanged " \
+                     "since the last verify.")
+
+    @staticmethod
+    def free_space(path):
+        """Returns the free bytes and the block size of the filesystem a path is
+        or will be on.
+        """
+        path = pt(path).absolute()
+        while not path.exists() and path != path.parent:
+            path = path.parent
+        if hasattr(os, 'statvfs'):
+            vfs = os.statvfs(path)
+            return vfs.f_bavail * vfs.f_frsize, vfs.f_frsize
+        return shutil.disk_usage(str(path)).free, 4096
+
+    @staticmethod
+    def ext_of(name):
+        """Returns the lowercase extension of a entry name; '' if it has none."""
+        dot = name.rfind('.')
+        return name[dot:].lower() if dot > name.rfind('/') + 1 else ''
+
+    def plan_depot(self):
+        """Sums what a extraction of the depot writes from the register alone; no
+        entry data is read. Entrys the manifest of a previous run lists as
+        complete are counted apart and unchecked. Besides the bytes the blocks
+        the files take on the output filesystem are summed.
+        """
+        done = {}
+        if self.resume:
+            done = {rec['name']: rec['len'] for rec in self.load_manifest(self.manifest_path())
+                    if rec.get('done')}
+        blk = self.free_space(self.out_pt)[1]
+        exts, ext_of = {}, self.ext_of
+        alloc = done_files = done_bytes = 0
+        for name, size in zip(self._reg.names, self._reg.sizes()):
+            if done and done.get(name) == size:
+                done_files += 1
+                done_bytes += size
+                continue
+            tot = exts.get(ext_of(name))
+            if tot is None:
+                tot = exts[ext_of(name)] = [0, 0]
+            tot[0] += 1
+            tot[1] += size
+            alloc += -(-size // blk)
+        alloc *= blk
+        files, size = (sum(_tot[_n] for _tot in exts.values()) for _n in (0, 1))
+        self._plan = {'files': files, 'bytes': size, 'alloc': alloc, 'exts': exts,
+                      'done_files': done_files, 'done_bytes': done_bytes}
+
+        msg = f"Archive {self.strify(pt(self.depot).name)}: {files} files with " \
+            f"{size / 1024 ** 2:.1f} MiB to write."
+        if done_files:
+            msg += f" {done_files} files are complete from a previous run."
+        self.inf(1, msg)
+
     def show_depot_content(self):
         """Lists the file content of a renpy archive without unpacking."""
         self.inf(2, "Listing archive files:")
@@ -389,6 +1587,117 @@ class RPAKit(RKC):
         self.inf(0, f"For archive >{pt(self.depot).name}< the identified version " \
                  f"variant is: {self._version['desc']!r}")
 
+    @staticmethod
+    def default_cache_dir():
+        """Returns the users standard cache location for RPA Kit."""
+        base = os.environ.get('XDG_CACHE_HOME') or os.environ.get('LOCALAPPDATA') \
+            or pt.home() / '.cache'
+        return pt(base) / 'rpakit'
+
+    @classmethod
+    def calibration_path(cls):
+        """Returns the path of the throughput calibration a benchmark run stores."""
+        return cls.default_cache_dir() / 'calibration.json'
+
+    def cache_file(self):
+        """Returns the cache path for the depot's register. Path, size, mtime and
+        header line are part of the key, so a changed depot never hits.
+        """
+        stat = os.stat(self.depot)
+        key = b'|'.join([os.fsencode(str(pt(self.depot).resolve())),
+                         b'%d' % stat.st_size, b'%d' % stat.st_mtime_ns,
+                         b'%d' % marshal.version, self._header])
+        return pt(self.cache_dir) / (hashlib.sha1(key).hexdigest() + '.rkc')
+
+    def load_cached_reg(self):
+        """Loads the ready decoded register from the cache. Returns False on a miss."""
+        if self.cache_dir is None:
+            return False
+        cache = self.cache_file()
+        try:
+            with cache.open('rb') as ofi:
+                self._reg = RegTable.from_state(marshal.loads(ofi.read()))
+            os.utime(cache)
+        except (OSError, EOFError, ValueError, TypeError, KeyError):
+            return False
+        self.inf(2, f"Register of {self.strify(self.depot)} loaded from cache.")
+        return True
+
+    def store_cached_reg(self):
+        """Stores the decoded register in the cache and keeps the cache in bounds."""
+        if self.cache_dir is None:
+            return
+        cache = self.cache_file()
+        tmp_file = cache.with_suffix(f'.{os.getpid()}-{threading.get_ident()}.tmp')
+        try:
+            self.make_dirstruct(cache.parent)
+            with tmp_file.open('wb') as ofi:
+                ofi.write(marshal.dumps(self._reg.state()))
+            os.replace(tmp_file, cache)
+        except OSError as err:
+            self.inf(1, f"{err}: Could not write the register cache.", m_sort='note')
+            if tmp_file.exists():
+                tmp_file.unlink()
+            return
+        self.evict_cache()
+
+    def evict_cache(self):
+        """Removes the least recently used registers till the cache fits its limit.
+        Other runs may share the cache and remove files meanwhile; that never
+        fails the run.
+        """
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as ents:
+                for entry in ents:
+                    if not entry.name.endswith('.rkc'):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue  # evicted by a concurrent run
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return
+        total = sum(size for _mt, size, _pt in entries)
+        for _mt, size, path in sorted(entries):
+            if total <= self.cache_limit:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    @staticmethod
+    def filter_rx(patterns):
+        """Translates filter patterns to one regex. A pattern with prefix `re:` is
+        taken as regex, a plain extension like `.rpyc` matches the suffix and
+        anything else is a glob.
+        """
+        parts = []
+        for pat in patterns:
+            if pat.startswith('re:'):
+                parts.append(f"(?s:.*?)(?:{pat[3:]})")
+            elif pat.startswith('.') and not any(char in pat for char in '*?[/'):
+                parts.append(f"(?s:.*)(?i:{re.escape(pat)})\\Z")
+            else:
+                parts.append(fnmatch.translate(pat))
+        return re.compile('|'.join(parts)) if parts else None
+
+    def filter_reg(self):
+        """Drops the register entrys the include/exclude filters reject, so only the
+        data of matching entrys is read later.
+        """
+        if not (self.include or self.exclude):
+            return
+        self.collect_reg_dirs()
+        inc_rx, exc_rx = self.filter_rx(self.include), self.filter_rx(self.exclude)
+        self._reg = self._reg.select(_fn for _fn in self._reg
+                                     if (inc_rx is None or inc_rx.match(_fn))
+                                     and (exc_rx is None or not exc_rx.match(_fn)))
+        self.inf(2, f"{len(self._reg)} files of the archive match the filters.")
+
     def init_depot(self):
         """Initializes depot files to a ready state for further operations."""
         self.get_header()
@@ -403,41 +1712,1097 @@ class RPAKit(RKC):
             self.inf(0, f"Skipping bogus archive: {self.strify(self.depot)}", m_sort='note')
         elif self.dep_initstate is True:
             self.get_version_specs()
-            self.collect_register()
-            self._reg = {self.utfify(_pt): _d for _pt, _d in self._reg.items()}
-            RKC.count['fle_total'] = len(self._reg)
+            if not self.load_cached_reg():
+                self.collect_register()
+                self.store_cached_reg()
+            self.filter_reg()
+            self.count['fle_total'] = len(self._reg)
+
+    @classmethod
+    def triage(cls, depot):
+        """Classifies a file by its header line alone and checks the index offset
+        against the file size. The register is never read. Returns the result as
+        dict.
+        """
+        res = {'path': str(depot), 'size': None, 'rpaid': None, 'desc': None,
+               'offset': None, 'key': None, 'status': 'ok'}
+        try:
+            with open(depot, 'rb') as ofi:
+                res['size'] = os.fstat(ofi.fileno()).st_size
+                head = ofi.readline(64)
+        except OSError as err:
+            res['status'] = f"unreadable: {err.strerror}"
+            return res
+
+        version = {}
+        for magic, val in cls._rpaformats.items():
+            if magic.encode() in head[:12]:
+                version = dict(val)
+        if version.get('rpaid') == 'rpa1' and (head[:1] != b'x' or pt(depot).suffix != '.rpi'):
+            version = {}
+        if not version:
+            res['status'] = 'unknown'
+            return res
+        res['rpaid'], res['desc'] = version['rpaid'], version['desc']
+        if version['rpaid'] not in cls._rpaspecs:
+            res['status'] = 'unsupported'
+            return res
+
+        version.update(cls._rpaspecs[version['rpaid']])
+        try:
+            if version['rpaid'] == 'rpa1':
+                res['offset'] = 0
+                if not pt(depot).with_suffix('.rpa').is_file():
+                    res['status'] = 'missing data file'
+                return res
+            res['offset'] = int(head[version['offset']], 16)
+            if version['key'] is not None:
+                res['key'] = int(head[version['key']], 16) ^ version.get('key2', 0)
+        except ValueError:
+            res['status'] = 'malformed header'
+            return res
+        if not len(head) <= res['offset'] < res['size']:
+            res['status'] = 'bad index offset'
+        return res
+
+    def run_task(self, task):
+        """Executes the requested task on the initialized depot."""
+        if task == 'exp':
+            self.unpack_depot()
+        elif task == 'lst':
+            self.show_depot_content()
+        elif task == 'tst':
+            self.test_depot()
+        elif task == 'vfy':
+            self.verify_depot()
+        elif task == 'pln':
+            self.plan_depot()
+
+
+RpaStat = namedtuple('RpaStat', 'name size offset segments')
+
+
+class RpaEntry(io.RawIOBase):
+    """
+    Read-only, seekable file object for one entry of a `RpaArchive`. The data
+    is read on demand from the depot; the entry is never extracted.
+    """
+
+    def __init__(self, archive, name, file_data):
+        super().__init__()
+        self.name = name
+        self._archive = archive
+        self._pos = 0
+        self._starts = []
+        self._segs = []
+        start = 0
+        if len(file_data) == 1:
+            ofs, leg, pre = file_data[0]
+            if pre:
+                self._add_seg(start, len(pre), pre)
+                start += len(pre)
+            self._add_seg(start, leg - len(pre), ofs)
+            start += leg - len(pre)
+        else:
+            for ofs, leg, _pre in file_data:
+                self._add_seg(start, leg, ofs)
+                start += leg
+        self._size = start
+
+    def _add_seg(self, start, leg, src):
+        """Adds a segment; its source is either prefix bytes or a depot offset."""
+        if leg > 0:
+            self._starts.append(start)
+            self._segs.append((start, leg, src))
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self._size
+        if pos < 0:
+            raise ValueError(f"Negative seek position {pos}.")
+        self._pos = pos
+        return pos
+
+    def readinto(self, buf):
+        view = memoryview(buf).cast('B')
+        done = 0
+        while done < len(view) and self._pos < self._size:
+            start, leg, src = self._segs[bisect.bisect_right(self._starts, self._pos) - 1]
+            rel = self._pos - start
+            num = min(leg - rel, len(view) - done)
+            if isinstance(src, bytes):
+                data = src[rel:rel + num]
+            else:
+                data = self._archive.read_at(src + rel, num)
+            if not data:
+                break
+            view[done:done + len(data)] = data
+            done += len(data)
+            self._pos += len(data)
+        return done
+
+    def readall(self):
+        return self.read(max(self._size - self._pos, 0))
+
+
+class RpaArchive:
+    """
+    Read-only virtual view of a RenPy archive. It uses the format detection and
+    register decoding of `RPAKit` and offers `names()`, `stat(name)` and
+    `open(name)` to read entrys straight from the depot without extracting.
+    Depot handles are shared in a LRU pool and recently read blocks are cached.
+    """
+    max_handles = 16
+    _handles = OrderedDict()
+    _hd_refs = {}
+    _hd_lock = threading.Lock()
+
+    def __init__(self, depot, cache_dir=None, block_size=64 * 1024, max_blocks=256,
+                 verbose=0):
+        rkit = RPAKit()
+        rkit.verbosity = verbose
+        rkit.depot = depot
+        rkit.cache_dir = cache_dir
+        rkit.init_depot()
+        if rkit.dep_initstate is not True:
+            raise ValueError(f"{depot} is not a Ren'Py archive or a unsupported variation.")
+
+        self.depot = pt(depot)
+        self.desc = rkit._version['desc']  # pylint:disable=w0212
+        self._reg = rkit._reg  # pylint:disable=w0212
+        self._data_pt = str(RPAKit.data_path(self.depot))
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+
+    def __contains__(self, name):
+        return name in self._reg
+
+    def __len__(self):
+        return len(self._reg)
+
+    def names(self):
+        """Returns the names of all entrys in the archive."""
+        return list(self._reg)
+
+    def stat(self, name):
+        """Returns size, depot offset and segment count of a entry."""
+        file_data = self._reg[name]
+        return RpaStat(name, RPAKit.entry_size(file_data), file_data[0][0], len(file_data))
+
+    def open(self, name):
+        """Returns a seekable file object which reads the entry from the depot."""
+        return RpaEntry(self, name, self._reg[name])
+
+    def read(self, name):
+        """Returns the whole data of a entry."""
+        with self.open(name) as ofi:
+            return ofi.read()
+
+    @classmethod
+    def _drop_fd(cls, fd):
+        """Closes a handle which left the pool, unless a read still uses it; then
+        the last reader closes it. Needs the pool lock.
+        """
+        if not cls._hd_refs.get(fd):
+            cls._hd_refs.pop(fd, None)
+            os.close(fd)
+
+    @classmethod
+    def _take_fd(cls, path):
+        """Takes the handle of a file from the shared LRU pool, opens it if needet
+        and counts the reference.
+        """
+        with cls._hd_lock:
+            fd = cls._handles.get(path)
+            if fd is None:
+                fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+                while len(cls._handles) >= cls.max_handles:
+                    cls._drop_fd(cls._handles.popitem(last=False)[1])
+                cls._handles[path] = fd
+            cls._handles.move_to_end(path)
+            cls._hd_refs[fd] = cls._hd_refs.get(fd, 0) + 1
+            return fd
+
+    @classmethod
+    def _give_fd(cls, path, fd):
+        """Puts a taken handle back; closes it if it was evicted meanwhile."""
+        with cls._hd_lock:
+            cls._hd_refs[fd] -= 1
+            if cls._handles.get(path) != fd:
+                cls._drop_fd(fd)
+
+    @classmethod
+    def read_raw(cls, path, ofs, size):
+        """Reads a byte range of a file through the shared LRU pool of handles.
+        The pool lock is only held to take and give back the handle, so reads
+        of several threads run in parallel.
+        """
+        fd = cls._take_fd(path)
+        try:
+            if hasattr(os, 'pread'):
+                return os.pread(fd, size, ofs)
+            with cls._hd_lock:
+                os.lseek(fd, ofs, os.SEEK_SET)
+                return os.read(fd, size)
+        finally:
+            cls._give_fd(path, fd)
+
+    def _block(self, blk_num):
+        """Returns a block of the depot; from the block cache if recently read."""
+        with self._lock:
+            block = self._blocks.get(blk_num)
+            if block is not None:
+                self._blocks.move_to_end(blk_num)
+                return block
+        block = self.read_raw(self._data_pt, blk_num * self.block_size, self.block_size)
+        with self._lock:
+            self._blocks[blk_num] = block
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+        return block
+
+    def read_at(self, ofs, size):
+        """Reads a byte range of the depot. Small reads go through the block
+        cache, large ones straight to the file.
+        """
+        if size >= 4 * self.block_size:
+            return self.read_raw(self._data_pt, ofs, size)
+        parts = []
+        end = ofs + size
+        while ofs < end:
+            blk_num, blk_ofs = divmod(ofs, self.block_size)
+            chunk = self._block(blk_num)[blk_ofs:blk_ofs + end - ofs]
+            if not chunk:
+                break
+            parts.append(chunk)
+            ofs += len(chunk)
+        return b''.join(parts)
+
+    def close(self):
+        """Drops the block cache and the depot handle of this archive."""
+        with self._lock:
+            self._blocks.clear()
+        with self._hd_lock:
+            fd = self._handles.pop(self._data_pt, None)
+            if fd is not None:
+                self._drop_fd(fd)
+
+
+class TarSink:
+    """
+    Output sink which streams the extracted entrys as members of a uncompressed
+    tar archive into a file or to stdout (`-`). No file of the entrys is
+    written; the data goes from the depot straight into the tar stream, for
+    large entrys by the kernel where possible.
+    """
+    buffering = 1024 ** 2
+    _ustar_mid = b'0000644\0' + b'0000000\0' * 2
+    _ustar_end = b' ' * 8 + b'0' + b'\0' * 100 + b'ustar\x0000' + b'\0' * 247
+
+    def __init__(self, target):
+        self.target = target
+        if target == '-':
+            self._ofi = open(sys.stdout.fileno(), 'wb', buffering=self.buffering, closefd=False)
+        else:
+            self._ofi = open(target, 'wb', buffering=self.buffering)
+        self._written = 0
+
+    @classmethod
+    def ustar_header(cls, name, size, mtime):
+        """Builds the plain ustar header of a file, which is most entrys. The tarfile
+        module is much slower at this. Returns None for names and sizes ustar
+        can't hold.
+        """
+        try:
+            raw = name.encode('ascii')
+        except UnicodeEncodeError:
+            return None
+        if len(raw) > 100 or size >= 8 ** 11 or not 0 <= mtime < 8 ** 11:
+            return None
+        head = b'%s%s%011o\0%011o\0%s' % (raw.ljust(100, b'\0'), cls._ustar_mid, size,
+                                          mtime, cls._ustar_end)
+        return head[:148] + b'%06o\0' % sum(head) + head[155:]
+
+    def add(self, kit, name, file_data, run=None, mtime=0):
+        """Writes header, data and padding of one entry."""
+        size, mtime = kit.entry_size(file_data), int(mtime)
+        head = self.ustar_header(name, size, mtime)
+        if head is None:
+            info = tarfile.TarInfo(name)
+            info.size, info.mtime, info.mode = size, mtime, 0o644
+            head = info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+        self._ofi.write(head)
+        if run is None:
+            self._ofi.flush()  # the data can be written by the kernel behind the buffer
+        kit.extract_data(self._ofi, file_data, run)
+        pad = -size % tarfile.BLOCKSIZE
+        self._ofi.write(tarfile.NUL * pad)
+        self._written += len(head) + size + pad
+
+    def close(self):
+        """Writes the end of archive blocks and pads the last record."""
+        end = tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+        self._written += len(end)
+        self._ofi.write(end + tarfile.NUL * (-self._written % tarfile.RECORDSIZE))
+        self._ofi.close()
+
+
+class ZipSink:
+    """
+    Output sink which streams the extracted entrys into a zip archive, stored
+    or deflated. To stdout (`-`) the zip is written with data descriptors, so
+    no seeking is needet.
+    """
+    buffering = 1024 ** 2
+
+    def __init__(self, target, deflate=False):
+        self.target = target
+        if target == '-':
+            self._ofi = open(sys.stdout.fileno(), 'wb', buffering=self.buffering, closefd=False)
+        else:
+            self._ofi = open(target, 'wb', buffering=self.buffering)
+        self._zip = zipfile.ZipFile(self._ofi, 'w', allowZip64=True,
+                                    compression=zipfile.ZIP_DEFLATED if deflate
+                                    else zipfile.ZIP_STORED)
+
+    def add(self, kit, name, file_data, run=None, mtime=0):
+        """Writes one entry as zip member. Several archives can hold the same name;
+        like in the output dir the later one wins on extraction.
+        """
+        info = zipfile.ZipInfo(name, time.localtime(max(mtime, 315532800))[:6])
+        info.compress_type = self._zip.compression
+        info.external_attr = 0o644 << 16
+        info.file_size = kit.entry_size(file_data)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)  # duplicate names
+            with self._zip.open(info, 'w') as zfi:
+                kit.extract_data(zfi, file_data, run, direct=False)
+
+    def close(self):
+        """Writes the central directory."""
+        self._zip.close()
+        self._ofi.close()
+
+
+class RKDecompiler:
+    """
+    Decompiler stage of the pipelined extract and decompile mode. Extracted
+    script files are handed over a bounded queue to worker threads, which
+    decompile them in batches while the extraction goes on. `unrpyc` runs
+    only in python 2, so the workers start it as separate process with the
+    files as arguments. Like in a run on the finished tree, existing output
+    files are not overwritten.
+    """
+    scripts = ('.rpyc', '.rpymc')
+    wait = 0.25
+
+    def __init__(self, kit, cmd=None, workers=2, batch=32, size=64):
+        self._kit = kit
+        self.cmd = self.default_cmd() if cmd is None else shlex.split(cmd)
+        self.batch = batch
+        self.done = 0
+        self.failed = 0
+        self.kept = 0
+        self._start_err = False
+        self.first = None
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=size)
+        self._workers = [threading.Thread(target=self._work, daemon=True)
+                         for _ in range(max(workers, 1))]
+        for worker in self._workers:
+            worker.start()
+
+    @staticmethod
+    def default_cmd():
+        """Returns the command for the bundled unrpyc with a python 2 found in the
+        path.
+        """
+        py2 = shutil.which('python2.7') or shutil.which('python2')
+        if py2 is None:
+            raise FileNotFoundError("No python 2 found to run unrpyc. Give the " \
+                                    "decompiler command with --decompile-cmd CMD.")
+        return [py2, str(pt(__file__).resolve().parent / 'unrpyc.py'), '-p', '1']
+
+    @staticmethod
+    def source_name(file_pt):
+        """Returns the name of the script source a compiled script decompiles to."""
+        base, ext = os.path.splitext(file_pt)
+        return base + ('.rpym' if ext == '.rpymc' else '.rpy')
+
+    def put(self, path):
+        """Queues a script file; blocks while the queue is full."""
+        self._queue.put(str(path))
+
+    def _work(self):
+        stop, wait = False, 0
+        while not stop:
+            path = self._queue.get()
+            if path is None:
+                break
+            batch = [path]
+            while len(batch) < self.batch:
+                try:
+                    path = self._queue.get(timeout=wait) if wait else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if path is None:
+                    stop = True
+                    break
+                batch.append(path)
+            self.decompile(batch)
+            # after the first batch it pays to wait for fuller ones, each
+            # process start costs more than a few small scripts
+            wait = self.wait
+
+    @classmethod
+    def source_mtime(cls, path):
+        """Returns the mtime of the source file a script decompiles to or None."""
+        try:
+            return os.stat(cls.source_name(path)).st_mtime_ns
+        except OSError:
+            return None
+
+    def decompile(self, batch):
+        """Runs the decompiler on a batch of files. A script counts as done if
+        its source file is new or changed afterwards. A source which existed
+        before and is unchanged was kept by a decompiler which ended without
+        error; else the script failed.
+        """
+        before = [self.source_mtime(path) for path in batch]
+        try:
+            res = subprocess.run(self.cmd + batch, stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT, check=False)
+        except OSError as err:
+            with self._lock:
+                self.failed += len(batch)
+                report, self._start_err = not self._start_err, True
+            if report:
+                self._kit.inf(0, f"{err}: The decompiler could not be started.", m_sort='warn')
+            return
+        output = res.stdout.decode('utf-8', 'replace').strip()
+        done = kept = 0
+        for path, old in zip(batch, before):
+            new = self.source_mtime(path)
+            if new is not None and new != old:
+                done += 1
+            elif new is not None and res.returncode == 0:
+                kept += 1
+        failed = len(batch) - done - kept
+        with self._lock:
+            self.done += done
+            self.kept += kept
+            self.failed += failed
+            if done and self.first is None:
+                self.first = time.monotonic() - self._start
+        if failed or res.returncode != 0:
+            self._kit.inf(1, f"The decompiler failed on {failed} of {len(batch)} scripts " \
+                          f"with exit code {res.returncode}.", m_sort='warn')
+            if output:
+                self._kit.inf(1, output, m_sort='raw')
+        elif output:
+            self._kit.inf(2, output, m_sort='raw')
+
+    def close(self):
+        """Waits till all queued scripts are decompiled and stops the workers."""
+        for _worker in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+
+RpaProgress = namedtuple('RpaProgress', 'state done total name')
+
+
+class RpaAsync:
+    """
+    asyncio front end of `RPAKit` for one archive. Register decode, listing and
+    extraction run in a executor, so the event loop is never blocked. The
+    extraction is a pipeline of three stages connected by bounded queues: the
+    planner puts the runs in offset order, `concurrency` writers extract them
+    in the executor and the reporter counts the written entrys. `progress()`
+    is a async iterator of the state; a slow reader only gets fewer snapshots
+    and never holds up the pipeline. A cancelled extraction halts the writes
+    at the next entry or block and closes the manifest, which lists only
+    complete entrys, so the next run resumes.
+    """
+    finals = ('done', 'cancelled', 'failed')
+
+    def __init__(self, depot, out_pt=None, concurrency=4, queue_size=16, executor=None,
+                 verbose=0, **kit_opts):
+        self.depot = pt(depot)
+        self.concurrency = max(concurrency, 1)
+        self.queue_size = queue_size
+        self._kit = RPAKit()
+        self._kit.verbosity = verbose
+        self._kit.depot = self.depot
+        self._kit.out_pt = pt(out_pt) if out_pt is not None \
+            else self.depot.parent / 'rpakit_out'
+        for opt, val in kit_opts.items():
+            if not hasattr(self._kit, opt) or opt.startswith('_'):
+                raise TypeError(f"Unknown option {opt!r} for the archive.")
+            setattr(self._kit, opt, val)
+        self._pool = executor
+        self._own_pool = executor is None
+        self._inflight = {}
+        self._ready = False
+        self._cond = None
+        self.state = 'idle'
+        self.done = 0
+        self.total = 0
+        self.name = None
+        self._seq = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_exc):
+        await self.close()
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        return self._pool
+
+    async def _call(self, func, *args):
+        """Runs a blocking call in the executor. Cancelling the caller leaves the
+        call running; it's awaited by the cleanup of the extraction.
+        """
+        cfut = self._executor().submit(func, *args)
+        fut = asyncio.wrap_future(cfut)
+        self._inflight[fut] = cfut
+        fut.add_done_callback(lambda _fut: self._inflight.pop(_fut, None))
+        return await asyncio.shield(fut)
+
+    async def _settle(self):
+        """Waits till no executor call of this archive runs anymore. Calls not yet
+        started are dropped.
+        """
+        calls = list(self._inflight.items())
+        for _fut, cfut in calls:
+            cfut.cancel()
+        if calls:
+            await asyncio.wait([fut for fut, _cfut in calls])
+        for fut, _cfut in calls:  # the errors are the ones of the halt
+            if not fut.cancelled():
+                fut.exception()
+
+    def _condition(self):
+        if self._cond is None:  # created in the running loop
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def _update(self, state=None, done=0, name=None):
+        async with self._condition():
+            self.state = state or self.state
+            self.done += done
+            self.name = name or self.name
+            self._seq += 1
+            self._cond.notify_all()
+
+    def snapshot(self):
+        """Returns the current state as `RpaProgress`."""
+        return RpaProgress(self.state, self.done, self.total, self.name)
+
+    async def open(self):
+        """Decodes the register of the archive once."""
+        if self._ready:
+            return
+        await self._call(self._kit.init_depot)
+        if self._kit.dep_initstate is not True:
+            raise ValueError(f"{self.depot} is not a Ren'Py archive or a unsupported variation.")
+        self._ready = True
+
+    async def test(self):
+        """Identifies the archive by its header. Returns the triage result as dict."""
+        return await self._call(RPAKit.triage, self.depot)
+
+    async def list(self):
+        """Returns the `RpaStat` of every entry in offset order."""
+        await self.open()
+        return await self._call(lambda: [RpaStat(_fn, RPAKit.entry_size(_d), _d[0][0], len(_d))
+                                         for _fn, _d in self._kit._reg.by_offset()])  # pylint:disable=w0212
+
+    async def progress(self):
+        """Yields a `RpaProgress` at each change of the state, from the current one
+        till the end of the extraction. Changes in between are merged.
+        """
+        cond, seen = self._condition(), -1
+        while True:
+            async with cond:
+                await cond.wait_for(lambda: self._seq != seen)
+                seen, snap = self._seq, self.snapshot()
+            yield snap
+            if snap.state in self.finals:
+                return
+
+    async def _planner(self, runs, work):
+        # the readahead hints only queue reads in the kernel, they don't block
+        for num in self._kit.advise_ahead([self._kit.run_span(_it) for _it in runs]):
+            await work.put(runs[num])
+        for _ in range(self.concurrency):
+            await work.put(None)
+
+    async def _writer(self, work, written):
+        items = await work.get()
+        while items is not None:
+            await self._call(self._kit.write_run, items)
+            await written.put(items)
+            items = await work.get()
+
+    async def _reporter(self, written):
+        items = await written.get()
+        while items is not None:
+            await self._update(done=len(items), name=items[-1][1])
+            items = await written.get()
+
+    async def extract(self):
+        """Extracts the archive into the output dir. Entrys a previous run
+        completed are skipped. Returns the number of files done.
+        """
+        if self.state == 'running':
+            raise RuntimeError(f"{self.depot} is already being extracted.")
+        await self.open()
+        self.done, self.total, self.name = 0, len(self._kit._reg), None  # pylint:disable=w0212
+        work = asyncio.Queue(maxsize=self.queue_size)
+        written = asyncio.Queue(maxsize=self.queue_size)
+        stages, state = [], 'failed'
+        try:
+            await self._update('running')
+            runs, fle_skip = await self._call(self._kit.plan_unpack)
+            await self._update(done=fle_skip)
+            pipeline = [asyncio.ensure_future(self._planner(runs, work))] \
+                + [asyncio.ensure_future(self._writer(work, written))
+                   for _ in range(self.concurrency)]
+            stages = pipeline + [asyncio.ensure_future(self._reporter(written))]
+            await asyncio.gather(*pipeline)
+            await written.put(None)
+            await stages[-1]
+            state = 'done'
+        except asyncio.CancelledError:
+            state = 'cancelled'
+            raise
+        finally:
+            if state != 'done':
+                self._kit.halt.set()
+                for stage in stages:
+                    stage.cancel()
+                if stages:
+                    await asyncio.wait(stages)
+                await self._settle()
+            if self._kit._progress is not None:  # pylint:disable=w0212
+                self._kit.end_unpack()
+            await self._update(state)
+        return self.done
+
+    async def close(self):
+        """Waits for running executor calls and shuts the own executor down."""
+        await self._settle()
+        if self._own_pool and self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+class RPAPacker(RKC):
+    """
+    Packs the files of a directory into a new RenPy archive. Writes RPA-3.0 or
+    the legacy RPA-2.0 layout. File data is streamed with large buffered
+    writes and the register is build alongside; at the end it's XOR scrambled,
+    pickled, compressed and appended.
+    """
+    buf_size = 8 * 1024 ** 2
+    _headers = {'rpa3': "RPA-3.0 {offset:016x} {key:08x}\n",
+                'rpa2': "RPA-2.0 {offset:016x}\n"}
+
+    def __init__(self, src, depot, rpaid='rpa3', key=None):
+        super().__init__()
+        if rpaid not in self._headers:
+            raise ValueError(f"Packing of the format {rpaid!r} is not supported.")
+        self.src = pt(src)
+        self.depot = pt(depot)
+        self.rpaid = rpaid
+        if key is None:
+            key = int.from_bytes(os.urandom(4), 'big')
+        self.key = key if rpaid == 'rpa3' else 0
+        self._reg = {}
+
+    def collect_files(self):
+        """Returns the archive names and paths of all files below the source dir.
+        The archive itself and RPA Kit's manifest dirs are left out.
+        """
+        depot = os.path.abspath(self.depot)
+        files = []
+        for fpath, subdirs, fnames in os.walk(self.src):
+            subdirs[:] = [sub for sub in subdirs if sub != '.rpakit']
+            for fln in fnames:
+                path = os.path.join(fpath, fln)
+                if os.path.abspath(path) != depot:
+                    files.append((pt(path).relative_to(self.src).as_posix(), path))
+        return sorted(files)
+
+    def add_file(self, ofi, name, path, buf):
+        """Streams one file into the archive and adds its scrambled register entry."""
+        offset, leg = ofi.tell(), 0
+        view = memoryview(buf)
+        with open(path, 'rb') as sfi:
+            num = sfi.readinto(buf)
+            while num:
+                ofi.write(view[:num])
+                leg += num
+                num = sfi.readinto(buf)
+        self._reg[name] = [(offset ^ self.key, leg ^ self.key, b'')]
+
+    def pack(self):
+        """Writes the archive. Returns the number of packed files."""
+        files = self.collect_files()
+        head_len = len(self._headers[self.rpaid].format(offset=0, key=0))
+        buf = bytearray(1024 ** 2)
+        self.make_dirstruct(self.depot.parent)
+        with self.depot.open('wb', buffering=self.buf_size) as ofi:
+            ofi.write(b'\0' * head_len)
+            progress = RKProgress(self, len(files))
+            for name, path in files:
+                self.add_file(ofi, name, path, buf)
+                progress.add(name)
+
+            offset = ofi.tell()
+            ofi.write(zlib.compress(pickle.dumps(self._reg, 2)))
+            ofi.seek(0)
+            ofi.write(self._headers[self.rpaid].format(offset=offset, key=self.key).encode())
+
+        self.inf(2, f"Packed {len(files)} files into archive: {self.strify(self.depot)}")
+        return len(files)
+
+
+def depot_worker(depot, out_pt, task, verbosity, kit_opts):
+    """Processes one depot in a worker process of the archive scheduler and
+    returns its results for the merge in the main process.
+    """
+    rkit = RPAKit()
+    rkit.verbosity = verbosity
+    rkit.depot, rkit.out_pt = depot, out_pt
+    for opt, val in kit_opts.items():
+        setattr(rkit, opt, val)
+    rkit.init_depot()
+    if rkit.dep_initstate is not True:
+        return depot, False, 0, 0, 0
+    rkit.run_task(task)
+    return rkit.depot, True, len(rkit._reg), rkit._dd_saved, rkit._vfy_bad  # pylint:disable=w0212
 
 
 class RKmain(RPAPathwork, RPAKit):
     """
     Main class to process args and executing the related methods. Args:
     Positional: {inp} takes `path` or `path + filename.suffix`
-    Keyword: {task=['exp'|'lst'|'tst']} expand/list content of the archiv(s) or test it
+    Keyword: {task=['exp'|'lst'|'tst'|'tri'|'vfy'|'pln'|'pak']} expand/list content of
+                 the archiv(s), test it, triage many files by header only, verify
+                 the output against the archive, plan a extraction without
+                 writing or pack a dir to a archive
+             {hash_algo=['blake2b'|'sha256']} hash of the verify task; default blake2b
+             {pack=ARCHIVE} the archive file the pack task writes
+             {pack_format=['rpa3'|'rpa2']} archive format of the pack task; default rpa3
              {outdir=NEWDIR} changes output directory for the archiv content
+             {jobs=N} number of threads which unpack the entrys of a archiv
+             {procs=N} number of processes which work on different archives
+             {cache=[True|DIR]} caches decoded registers; in DIR or standard location
+             {cache_limit=BYTES} size bound of the register cache
+             {progress_rate=HZ} max progress updates per second; default 5
+             {progress_bg=[True|False]} progress output from a background thread
+             {dedupe=[True|False]} links duplicate files as reflink or hardlink
+             {stream_min=BYTES} entrys from this size on are streamed in blocks
+             {to_tar=FILE|-} expands into a tar archive or to stdout instead of a dir
+             {to_zip=FILE|-} expands into a zip archive or to stdout instead of a dir
+             {zip_deflate=[True|False]} deflates the zip members; default stored
+             {decompile=[True|CMD]} decompiles the scripts while the extraction runs;
+                 with the bundled unrpyc or the given decompiler command
+             {decompilers=N} number of parallel decompiler processes; default 2
+             {recursive=[True|False]} searches also subdirs and identifys archives
+                 by header instead of suffix
+             {probes=N} number of concurrent header probes of the recursive search
+             {resume=[True|False]} skips entrys a previous run completed; default True
+             {include=[PATTERN]} only entrys matching one of the patterns
+             {exclude=[PATTERN]} no entrys matching one of the patterns
+                 Patterns are globs, extensions like `.rpyc` or regex with `re:` prefix
              {verbose=[0|1|2]} information output level; defaults to 1
     """
 
     def __init__(self, inpath, outdir=None, verbose=None, **kwargs):
-        if verbose is not None:
-            RKC.verbosity = verbose
         super().__init__()
+        if verbose is not None:
+            self.verbosity = verbose
         self.raw_inp = inpath
         if outdir is not None:
             self.outdir = outdir
         self.task = kwargs.get('task')
+        if kwargs.get('jobs') is not None:
+            self.jobs = kwargs.get('jobs')
+        self.procs = kwargs.get('procs') or 1
+        if kwargs.get('cache') is True:
+            self.cache_dir = self.default_cache_dir()
+        elif kwargs.get('cache'):
+            self.cache_dir = pt(kwargs.get('cache'))
+        if kwargs.get('cache_limit') is not None:
+            self.cache_limit = kwargs.get('cache_limit')
+        if kwargs.get('resume') is not None:
+            self.resume = kwargs.get('resume')
+        self.recursive = bool(kwargs.get('recursive'))
+        self.dedupe = bool(kwargs.get('dedupe'))
+        if kwargs.get('progress_rate') is not None:
+            self.progress_rate = kwargs.get('progress_rate')
+        self.progress_bg = bool(kwargs.get('progress_bg'))
+        self.pack = kwargs.get('pack')
+        self.pack_format = kwargs.get('pack_format') or 'rpa3'
+        if kwargs.get('probes') is not None:
+            self.probes = kwargs.get('probes')
+        self.include = list(kwargs.get('include') or [])
+        self.exclude = list(kwargs.get('exclude') or [])
+        if kwargs.get('hash_algo') is not None:
+            self.hash_algo = kwargs.get('hash_algo')
+        if kwargs.get('stream_min') is not None:
+            self.stream_min = kwargs.get('stream_min')
+        self.to_tar = kwargs.get('to_tar')
+        self.to_zip = kwargs.get('to_zip')
+        self.zip_deflate = bool(kwargs.get('zip_deflate'))
+        self.decompile = kwargs.get('decompile')
+        self.decompilers = kwargs.get('decompilers') or 2
+        if '-' in (self.to_tar, self.to_zip):
+            self.msg_out = sys.stderr  # stdout carries the archive
+        if self.task == 'tri':
+            self.msg_out = sys.stderr  # stdout carries the JSON lines
+        if self.to_tar or self.to_zip:
+            self.resume = False  # a output archive is always written whole
+        self.plan_tot = {'files': 0, 'bytes': 0, 'alloc': 0, 'exts': {},
+                         'done_files': 0, 'done_bytes': 0}
 
     def done_msg(self):
         """Gives a final info when all is done."""
         if self.task == 'exp':
-            if RKC.count['dep_done'] > 0:
-                self.inf(0, f" Done. We unpacked {RKC.count['dep_done']} archive(s).")
+            if self.count['dep_done'] > 0:
+                self.inf(0, f" Done. We unpacked {self.count['dep_done']} archive(s) " \
+                         f"with {self.count['fle_done']} files.")
+                if self.decompile:
+                    self.inf(0, f"Decompiled {self.count['dc_done']} script(s); " \
+                             f"{self.count['dc_failed']} failed.")
+                    if self.count['dc_kept']:
+                        self.inf(0, f"{self.count['dc_kept']} script(s) kept their existing " \
+                                 "source file.")
+                if self.dedupe:
+                    self.inf(0, f"Linking duplicates saved {self.count['dd_saved'] / 1024 ** 2:.1f} MiB.")
             else:
                 self.inf(0, f"Oops! No archives where processed...")
+        elif self.task == 'vfy':
+            self.inf(0, f" Done. We verified {self.count['fle_done']} files of " \
+                     f"{self.count['dep_done']} archive(s).")
+            if self.count['vfy_bad']:
+                self.inf(0, f"{self.count['vfy_bad']} output files differ or are missing.",
+                         m_sort='warn')
+        elif self.task == 'pln':
+            self.plan_msg()
         elif self.task  in ['lst', 'tst']:
             self.inf(0, f"Completed!")
+        elif self.task == 'pak':
+            self.inf(0, f" Done. We packed {self.count['fle_done']} files into {self.pack}.")
+
+    def add_plan(self):
+        """Adds the plan of the processed depot to the totals."""
+        for key in ('files', 'bytes', 'alloc', 'done_files', 'done_bytes'):
+            self.plan_tot[key] += self._plan[key]
+        for ext, (files, size) in self._plan['exts'].items():
+            tot = self.plan_tot['exts'].setdefault(ext, [0, 0])
+            tot[0] += files
+            tot[1] += size
+
+    @staticmethod
+    def load_calibration():
+        """Returns the stored throughput calibration or None if there is none."""
+        try:
+            with RPAKit.calibration_path().open('r', encoding='utf-8') as ofi:
+                cal = json.load(ofi)
+            float(cal['file_s']), float(cal['byte_s'])  # pylint:disable=w0106
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return cal
+
+    def plan_msg(self):
+        """Outputs the totals of the plan by extension, checks the free space of
+        the output filesystem and estimates the duration.
+        """
+        tot = self.plan_tot
+        self.inf(0, f" Plan for {self.count['dep_done']} archive(s): {tot['files']} files " \
+                 f"with {tot['bytes'] / 1024 ** 2:.1f} MiB to write.")
+        for ext, (files, size) in sorted(tot['exts'].items(), key=lambda _it: -_it[1][1]):
+            print(f"{ext or '(none)':>12} {files:>10} files {size / 1024 ** 2:>12.1f} MiB",
+                  file=self.msg_out)
+        if tot['done_files']:
+            self.inf(0, f"{tot['done_files']} files with {tot['done_bytes'] / 1024 ** 2:.1f} " \
+                     "MiB are complete from a previous run and skipped.")
+
+        target = self.to_tar or self.to_zip
+        if target == '-':
+            self.inf(0, "The output goes to stdout; no free space to check.")
+        else:
+            target = pt(target).parent if target else self.out_pt
+            # in a output archive headers and padding take at most 1 KiB per file
+            need = tot['bytes'] + tot['files'] * 1024 if self.to_tar or self.to_zip \
+                else tot['alloc']
+            free = self.free_space(target)[0]
+            if need > free:
+                self.inf(0, f"The output needs {need / 1024 ** 2:.1f} MiB, but only " \
+                         f"{free / 1024 ** 2:.1f} MiB are free at {target}.", m_sort='warn')
+            else:
+                self.inf(0, f"The output needs {need / 1024 ** 2:.1f} MiB of " \
+                         f"{free / 1024 ** 2:.1f} MiB free at {target}.")
+
+        cal = self.load_calibration()
+        if cal is None:
+            self.inf(0, "No throughput calibration found for a estimate of the duration. " \
+                     "Run `bench/rpakit_suite.py --calibrate` on this host.", m_sort='note')
+            return
+        secs = tot['files'] * cal['file_s'] + tot['bytes'] * cal['byte_s']
+        self.inf(0, f"Estimated duration: {secs:.1f} s; calibrated with {cal.get('jobs', 1)} " \
+                 f"job(s) on {cal.get('created', 'a earlier run')}.")
+        if cal.get('jobs', 1) != self.jobs:
+            self.inf(1, f"The estimate is for {cal.get('jobs', 1)} job(s), not the requested " \
+                     f"{self.jobs}.", m_sort='note')
+
+    def kit_opts(self):
+        """Returns the RPAKit settings the worker processes must share."""
+        return {'jobs': self.jobs,
+                'resume': self.resume,
+                'include': self.include,
+                'exclude': self.exclude,
+                'dedupe': self.dedupe,
+                'progress_rate': self.progress_rate,
+                'progress_bg': self.progress_bg,
+                'cache_dir': self.cache_dir,
+                'cache_limit': self.cache_limit,
+                'hash_algo': self.hash_algo,
+                'stream_min': self.stream_min}
+
+    def count_depot(self, depot, fle_num, dd_saved=0, vfy_bad=0):
+        """Adds the results of a processed depot to the totals."""
+        self.count['dep_done'] += 1
+        self.count['fle_done'] += fle_num
+        self.count['dd_saved'] += dd_saved
+        self.count['vfy_bad'] += vfy_bad
+        self.inf(1, f"[{self.count['dep_done'] / float(self.count['dep_found']):05.1%}] {self.strify(depot):>4}")
+
+    @staticmethod
+    def depot_size(depot):
+        """Returns the size of the depot's data file; for sorting by workload."""
+        try:
+            return RPAKit.data_path(depot).stat().st_size
+        except OSError:
+            return 0
+
+    def schedule_depots(self):
+        """Processes the depots concurrent in worker processes; the largest
+        archive first. The results are merged into the totals. Depots may share
+        output paths, so the workers write each file beside its path and
+        replace it at once.
+        """
+        self.dep_lst.sort(key=self.depot_size, reverse=True)
+        kit_opts = dict(self.kit_opts(), replace_out=True)
+        with ProcessPoolExecutor(max_workers=self.procs) as pool:
+            jobs = {pool.submit(depot_worker, depot, self.out_pt, self.task,
+                                self.verbosity, kit_opts): depot for depot in self.dep_lst}
+            self.dep_lst.clear()
+            for job in as_completed(jobs):
+                try:
+                    depot, done, fle_num, dd_saved, vfy_bad = job.result()
+                except OSError as err:
+                    raise Exception(f"{err}: Error while opening archive file " \
+                                    f">{jobs[job]}< for initialization.")
+                if done:
+                    self.count_depot(depot, fle_num, dd_saved, vfy_bad)
+
+    def triage_depots(self):
+        """Classifies all found depots concurrent by header only and prints one
+        JSON line per file.
+        """
+        with ThreadPoolExecutor(max_workers=max(self.probes, 1)) as pool:
+            for res in pool.map(self.triage, self.dep_lst):
+                print(json.dumps(res))
+                if res['status'] == 'ok':
+                    self.count['dep_done'] += 1
+        self.dep_lst.clear()
+
+    def pack_depot(self):
+        """Packs the input directory into the requested archive."""
+        if not pt(self.raw_inp).is_dir():
+            raise NotADirectoryError(f"To pack an archive the input >{self.raw_inp}< " \
+                                     "must be a directory.")
+        rpk = RPAPacker(self.raw_inp, self.pack, rpaid=self.pack_format)
+        self.count['fle_done'] = rpk.pack()
+        self.count['dep_done'] += 1
+
+    def open_sink(self):
+        """Opens the output archive if one was requested instead of the dir."""
+        if self.task != 'exp':
+            return
+        if self.to_tar:
+            self.sink = TarSink(self.to_tar)
+        elif self.to_zip:
+            self.sink = ZipSink(self.to_zip, deflate=self.zip_deflate)
+        if self.sink is not None and self.procs > 1:
+            self.inf(1, "Archives are streamed into one output, so they are " \
+                     "processed one after the other.", m_sort='note')
+            self.procs = 1
+
+    def open_decompiler(self):
+        """Starts the decompiler stage if the pipelined decompile was requested."""
+        if self.task != 'exp' or not self.decompile:
+            return
+        if self.sink is not None:
+            self.inf(0, "Scripts in a output archive can't be decompiled. Skipped.",
+                     m_sort='note')
+            self.decompile = None
+            return
+        self.decomp = RKDecompiler(self, None if self.decompile is True else self.decompile,
+                                   workers=self.decompilers)
+        if self.procs > 1:
+            self.inf(1, "The decompiler takes the scripts from this process, so the " \
+                     "archives are processed one after the other.", m_sort='note')
+            self.procs = 1
+
+    def close_decompiler(self):
+        """Waits for the decompiler stage and adds its results to the totals."""
+        if self.decomp is None:
+            return
+        self.decomp.close()
+        self.count['dc_done'] += self.decomp.done
+        self.count['dc_failed'] += self.decomp.failed
+        self.count['dc_kept'] += self.decomp.kept
+        if self.decomp.first is not None:
+            self.inf(2, f"The first script was decompiled after {self.decomp.first:.2f} s.")
+        self.decomp = None
 
     def cfg_control(self):
         """Processes input, yields depot's to the functions."""
+        if self.task == 'pak':
+            self.pack_depot()
+            self.done_msg()
+            return
+
         if pt(self.raw_inp).is_file():
             self.inf(2, f"Input is a file. Processing {self.raw_inp}.")
         elif pt(self.raw_inp).is_dir():
@@ -451,27 +2816,35 @@ class RKmain(RPAPathwork, RPAKit):
                 f"{err}: Error while testing and prepairing input path " \
                 f">{self.raw_inp}< for the main job.")
 
-        while self.dep_lst:
-            self.depot = self.dep_lst.pop()
-            try:
-                self.init_depot()
-            except OSError as err:
-                raise Exception(f"{err}: Error while opening archive file " \
-                                f">{self.depot}< for initialization.")
-
-            if self.dep_initstate is False:
-                continue
-
-            if self.task == 'exp':
-                self.unpack_depot()
-            elif self.task == 'lst':
-                self.show_depot_content()
-            elif self.task == 'tst':
-                self.test_depot()
+        self.open_sink()
+        self.open_decompiler()
+        if self.task == 'tri':
+            self.triage_depots()
+        elif self.procs > 1 and self.task in ('exp', 'vfy'):
+            self.schedule_depots()  # listings and tests print per depot in order
 
-            RKC.count['dep_done'] += 1
-            self.inf(1, f"[{RKC.count['dep_done'] / float(RKC.count['dep_found']):05.1%}] {self.strify(self.depot):>4}")
-            self.clear_rk_vars()
+        try:
+            while self.dep_lst:
+                self.depot = self.dep_lst.pop()
+                try:
+                    self.init_depot()
+                except OSError as err:
+                    raise Exception(f"{err}: Error while opening archive file " \
+                                    f">{self.depot}< for initialization.")
+
+                if self.dep_initstate is False:
+                    continue
+
+                self.run_task(self.task)
+                if self.task == 'pln':
+                    self.add_plan()
+                self.count_depot(self.depot, len(self._reg), self._dd_saved, self._vfy_bad)
+                self.clear_rk_vars()
+        finally:
+            if self.sink is not None:
+                self.sink.close()
+                self.sink = None
+            self.close_decompiler()
 
         self.done_msg()
 
@@ -490,15 +2863,21 @@ def parse_args():
 
     def valid_switch():
         """Helper function to determine if a task is choosen."""
+        if args.pack:
+            args.task = 'pak'
         if not args.task:
             aps.print_help()
             raise argparse.ArgumentError(args.task, f"\nNo task requested; " \
-                                         "either -e, -l or -t is required.")
+                                         "either -e, -l, -t, -T, -V, -n or -P is required.")
 
     desc = """Program for searching and unpacking RPA files. EXAMPLE USAGE:
     rpakit.py -e -o unpacked /home/{USERNAME}/somedir/search_here
     rpakit.py -t /home/{USERNAME}/otherdir/file.rpa
-    rpakit.py -e c:/Users/{USERNAME}/my_folder/A123.rpa"""
+    rpakit.py -e c:/Users/{USERNAME}/my_folder/A123.rpa
+    rpakit.py -V -o unpacked /home/{USERNAME}/somedir/file.rpa
+    rpakit.py -n --cache -o unpacked /home/{USERNAME}/somedir
+    rpakit.py -e --to-tar - /home/{USERNAME}/somedir | tar -x -C unpacked
+    rpakit.py -P /home/{USERNAME}/patched.rpa /home/{USERNAME}/somedir/rpakit_out"""
     epi = "Standard output dir is set to ´{Target}/rpakit_out/´. Change with option -o."
     aps = argparse.ArgumentParser(description=desc, epilog=epi, formatter_class=argparse.RawTextHelpFormatter)
     aps.add_argument('inpath',
@@ -521,10 +2900,119 @@ def parse_args():
                       action='store_const',
                       const='tst',
                       help='Tests if archive(s) are a known format.')
+    opts.add_argument('-T', '--triage',
+                      dest='task',
+                      action='store_const',
+                      const='tri',
+                      help='Classifies archive(s) by header only; one JSON line per\n'
+                      'file. Use with --verbose 0 for clean output.')
+    opts.add_argument('-V', '--verify',
+                      dest='task',
+                      action='store_const',
+                      const='vfy',
+                      help='Hashes all stored files without unpacking and compares the\n'
+                      'output dir against them. Writes a hash manifest; files\n'
+                      'unchanged since the last verify are not read again.')
+    opts.add_argument('-n', '--plan',
+                      dest='task',
+                      action='store_const',
+                      const='pln',
+                      help='Plans a extraction without writing: files and bytes per\n'
+                      'archive and extension, free space of the output filesystem\n'
+                      'and the duration from a calibration of rpakit_suite.py.')
+    opts.add_argument('-P', '--pack',
+                      metavar='ARCHIVE',
+                      help='Packs all files of the Target directory into a new archive.')
     aps.add_argument("-o", "--outdir",
                      action="store",
                      type=str,
                      help="Extracts to the given path instead of standard.")
+    sinks = aps.add_mutually_exclusive_group()
+    sinks.add_argument('--to-tar',
+                       metavar='FILE',
+                       help='Expands into a uncompressed tar archive instead of the\n'
+                       'output dir. With `-` the tar goes to stdout.')
+    sinks.add_argument('--to-zip',
+                       metavar='FILE',
+                       help='Expands into a zip archive instead of the output dir.\n'
+                       'With `-` the zip goes to stdout.')
+    aps.add_argument('--zip-deflate',
+                     action='store_true',
+                     help='Deflates the members of --to-zip. Default: stored')
+    aps.add_argument('-d', '--decompile',
+                     action='store_true',
+                     help='Decompiles the scripts while the other files are still\n'
+                     'extracted; with the bundled unrpyc in python 2.')
+    aps.add_argument('--decompile-cmd',
+                     metavar='CMD',
+                     help='Decompiler command instead of the bundled unrpyc, which\n'
+                     'gets the .rpyc files as arguments. Implies --decompile.')
+    aps.add_argument('--decompilers',
+                     metavar='N',
+                     type=int,
+                     help='Number of parallel decompiler processes. Default: 2')
+    aps.add_argument('--format',
+                     dest='pack_format',
+                     choices=['rpa3', 'rpa2'],
+                     default='rpa3',
+                     help='Archive format for -P. Default: rpa3')
+    aps.add_argument('--hash',
+                     dest='hash_algo',
+                     choices=['blake2b', 'sha256'],
+                     default='blake2b',
+                     help='Hash algorithm for -V. Default: blake2b')
+    aps.add_argument('-j', '--jobs',
+                     metavar='N',
+                     type=int,
+                     default=1,
+                     help='Number of threads which unpack the files of a archive.')
+    aps.add_argument('-p', '--procs',
+                     metavar='N',
+                     type=int,
+                     default=1,
+                     help='Number of processes which unpack or verify archives\n'
+                     'concurrent.')
+    aps.add_argument('--cache',
+                     action='store_true',
+                     help='Caches decoded archive registers for faster reruns.')
+    aps.add_argument('--cache-dir',
+                     metavar='DIR',
+                     help='Keeps the register cache in DIR instead of the standard\n'
+                     'location. Implies --cache.')
+    aps.add_argument('--cache-limit',
+                     metavar='MiB',
+                     type=int,
+                     help='Size bound of the register cache. Default: 512')
+    aps.add_argument('--dedupe',
+                     action='store_true',
+                     help='Writes files with the same content only once; duplicates\n'
+                     'become reflinks where supported, else hardlinks.')
+    aps.add_argument('--stream-min',
+                     metavar='MiB',
+                     type=int,
+                     help='Files from this size on are copied in blocks, so memory\n'
+                     'use stays flat for very large files. Default: 32')
+    aps.add_argument('--no-resume',
+                     dest='resume',
+                     action='store_false',
+                     help='Rewrites all files, also those a previous run completed.')
+    aps.add_argument('-r', '--recursive',
+                     action='store_true',
+                     help='Searches also all subdirectorys and identifys archives by\n'
+                     'their header, so also nonstandard names are found.')
+    aps.add_argument('-i', '--include',
+                     metavar='PATTERN',
+                     action='append',
+                     help='Processes only files which match the pattern. Repeatable.\n'
+                     'Globs (images/ui/*), extensions (.rpyc) or regex (re:^scripts/).')
+    aps.add_argument('-x', '--exclude',
+                     metavar='PATTERN',
+                     action='append',
+                     help='Skips files which match the pattern. Repeatable.')
+    aps.add_argument('--progress-rate',
+                     metavar='HZ',
+                     type=float,
+                     help='Max progress updates per second at verbose 2. Default: 5')
     aps.add_argument('--verbose',
                      metavar='level [0-2]',
                      type=int,
@@ -542,5 +3030,14 @@ if __name__ == '__main__':
     assert sys.version_info >= (3, 6), \
         f"Must be executed in Python 3.6 or later. You are running {sys.version}"
     CFG = parse_args()
-    RKM = RKmain(CFG.inpath, outdir=CFG.outdir, verbose=CFG.verbose, task=CFG.task)
+    RKM = RKmain(CFG.inpath, outdir=CFG.outdir, verbose=CFG.verbose, task=CFG.task,
+                 jobs=CFG.jobs, procs=CFG.procs, cache=CFG.cache_dir or CFG.cache,
+                 cache_limit=CFG.cache_limit and CFG.cache_limit * 1024 ** 2,
+                 resume=CFG.resume, include=CFG.include, exclude=CFG.exclude,
+                 recursive=CFG.recursive, dedupe=CFG.dedupe, pack=CFG.pack,
+                 pack_format=CFG.pack_format, hash_algo=CFG.hash_algo,
+                 stream_min=CFG.stream_min and CFG.stream_min * 1024 ** 2,
+                 to_tar=CFG.to_tar, to_zip=CFG.to_zip, zip_deflate=CFG.zip_deflate,
+                 decompile=CFG.decompile_cmd or CFG.decompile, decompilers=CFG.decompilers,
+                 progress_rate=CFG.progress_rate, progress_bg=CFG.jobs > 1)
     RKM.cfg_control()